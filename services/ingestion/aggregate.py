@@ -1,11 +1,26 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import argparse
 from datetime import datetime, timedelta
-from typing import Dict
+from typing import Dict, Optional, Set
+
+import numpy as np
+from psycopg2.extras import execute_values
 
 from .config import get_settings
-from .db import get_connection
+from .db import close_pool, pooled_connection, transaction
+from .rollups import (
+    cleanup_old_rollups,
+    companies_changed_since,
+    companies_in_buckets,
+    floor_hour,
+    load_rollup_state,
+    refresh_rollups,
+    save_rollup_state,
+    shifted_bucket_ranges,
+    snapshot_xmin,
+)
+from .scoring import ScoredWindow, WindowArrays, score_window
 from .sources import ADAPTERS
 
 
@@ -17,181 +32,283 @@ WINDOWS = {
 }
 
 
-@dataclass
-class WindowMetrics:
-    total: int
-    one_star: int
-    negative: int
-    sources: int
-
+def _window_columns(alias: str, condition: str) -> list[str]:
+    return [
+        f"COALESCE(SUM(total) FILTER (WHERE {condition}), 0) AS {alias}_total",
+        f"COALESCE(SUM(one_star) FILTER (WHERE {condition}), 0) AS {alias}_one_star",
+        f"COALESCE(SUM(negative) FILTER (WHERE {condition}), 0) AS {alias}_negative",
+        f"COUNT(DISTINCT source) FILTER (WHERE {condition} AND total > 0) AS {alias}_sources",
+    ]
+
+
+def fetch_window_arrays(
+    conn,
+    now: datetime,
+    windows: Dict[str, int],
+    company_ids: list[int],
+    restrict: bool = False,
+) -> Dict[str, WindowArrays]:
+    # Both periods are exactly h hours and end at now. Whole hours come from
+    # the rollups; the hours cut by a period boundary are counted from
+    # raw_events instead so the edges are exact to the second.
+    current_hour = floor_hour(now)
+    edges = {current_hour}
+    if now > current_hour:
+        for hours in windows.values():
+            edges.add(current_hour - timedelta(hours=hours))
+            edges.add(current_hour - timedelta(hours=hours * 2))
+    params: dict = {"now": now, "company_ids": company_ids, "edges": sorted(edges)}
+    columns: list[str] = []
+    for idx, hours in enumerate(windows.values()):
+        params[f"cur_{idx}"] = now - timedelta(hours=hours)
+        params[f"prev_{idx}"] = now - timedelta(hours=hours * 2)
+        columns += _window_columns(f"cur_{idx}", f"bucket >= %(cur_{idx})s")
+        columns += _window_columns(
+            f"prev_{idx}",
+            f"bucket >= %(prev_{idx})s AND bucket < %(cur_{idx})s",
+        )
+    params["start"] = floor_hour(
+        min(value for key, value in params.items() if key.startswith("prev_"))
+    )
+    edge_ranges = []
+    for idx, edge in enumerate(params["edges"]):
+        params[f"edge_{idx}"] = edge
+        params[f"edge_end_{idx}"] = min(edge + timedelta(hours=1), now)
+        edge_ranges.append(
+            f"(re.created_at >= %(edge_{idx})s AND re.created_at < %(edge_end_{idx})s)"
+        )
+    company_filter = "AND company_id = ANY(%(company_ids)s)" if restrict else ""
+    raw_company_filter = "AND re.company_id = ANY(%(company_ids)s)" if restrict else ""
 
-def fetch_metrics(conn, start: datetime, end: datetime) -> Dict[int, WindowMetrics]:
     with conn.cursor() as cur:
         cur.execute(
-            """
+            f"""
+            WITH counted AS (
+              SELECT company_id, source, bucket, total, one_star, negative
+              FROM event_rollups_hourly
+              WHERE bucket >= %(start)s AND bucket < %(now)s
+                AND bucket <> ALL(%(edges)s::timestamptz[])
+                {company_filter}
+              UNION ALL
+              SELECT
+                  re.company_id,
+                  re.source,
+                  re.created_at,
+                  1,
+                  CASE WHEN re.rating IS NOT NULL AND re.rating <= 1 THEN 1 ELSE 0 END,
+                  CASE WHEN se.is_negative THEN 1 ELSE 0 END
+              FROM raw_events re
+              LEFT JOIN sentiment_events se ON se.raw_event_id = re.id
+              WHERE ({" OR ".join(edge_ranges)})
+                {raw_company_filter}
+            )
             SELECT
-                re.company_id,
-                COUNT(*) as total,
-                SUM(CASE WHEN re.rating IS NOT NULL AND re.rating <= 1 THEN 1 ELSE 0 END) as one_star,
-                SUM(CASE WHEN se.is_negative THEN 1 ELSE 0 END) as negative,
-                COUNT(DISTINCT re.source) as sources
-            FROM raw_events re
-            LEFT JOIN sentiment_events se ON se.raw_event_id = re.id
-            WHERE re.created_at >= %s AND re.created_at < %s
-            GROUP BY re.company_id
+                company_id,
+                {", ".join(columns)}
+            FROM counted
+            GROUP BY company_id
             """,
-            (start, end),
+            params,
         )
         rows = cur.fetchall()
 
-    return {
-        row[0]: WindowMetrics(
-            total=row[1] or 0,
-            one_star=row[2] or 0,
-            negative=row[3] or 0,
-            sources=row[4] or 0,
-        )
-        for row in rows
-    }
+    ids = np.asarray(sorted(company_ids), dtype=np.int64)
+    data = np.asarray(rows, dtype=np.int64).reshape(len(rows), 1 + 8 * len(windows))
+    positions = np.searchsorted(ids, data[:, 0])
+    known = positions < len(ids)
+    known[known] = ids[positions[known]] == data[known, 0]
+    positions, data = positions[known], data[known]
+
+    result: Dict[str, WindowArrays] = {}
+    for idx, window in enumerate(windows):
+        arrays = WindowArrays.empty(ids)
+        offset = 1 + idx * 8
+        arrays.current[positions] = data[:, offset : offset + 4]
+        arrays.previous[positions] = data[:, offset + 4 : offset + 8]
+        result[window] = arrays
+    return result
 
 
 def fetch_company_ids(conn) -> list[int]:
     with conn.cursor() as cur:
-        cur.execute(\"SELECT id FROM companies WHERE active = true\")
+        cur.execute("SELECT id FROM companies WHERE active = true")
         rows = cur.fetchall()
     return [row[0] for row in rows]
 
 
-def safe_pct_delta(current: int, previous: int) -> float:
-    if previous <= 0:
-        return float(current) * 100.0
-    return ((current - previous) / previous) * 100.0
-
-
-def compute_momentum_score(
-    complaint_velocity: float,
-    negative_momentum: float,
-    source_diversity: float,
-) -> float:
-    return (
-        complaint_velocity * 0.45
-        + source_diversity * 0.35
-        + negative_momentum * 0.20
-    )
+def upsert_aggregates(conn, window: str, scored: ScoredWindow, updated_at: datetime) -> None:
+    if not len(scored):
+        return
+    rows = [
+        (company_id, window, *values, updated_at)
+        for company_id, *values in zip(
+            scored.company_ids.tolist(),
+            scored.complaint_count.tolist(),
+            scored.one_star_delta.tolist(),
+            scored.complaint_velocity.tolist(),
+            scored.negative_momentum.tolist(),
+            scored.source_diversity.tolist(),
+        )
+    ]
+    with conn.cursor() as cur:
+        execute_values(
+            cur,
+            """
+            INSERT INTO agg_windows
+              (company_id, window, complaint_count, one_star_delta, complaint_velocity,
+               negative_momentum, source_diversity, updated_at)
+            VALUES %s
+            ON CONFLICT (company_id, window) DO UPDATE SET
+              complaint_count = EXCLUDED.complaint_count,
+              one_star_delta = EXCLUDED.one_star_delta,
+              complaint_velocity = EXCLUDED.complaint_velocity,
+              negative_momentum = EXCLUDED.negative_momentum,
+              source_diversity = EXCLUDED.source_diversity,
+              updated_at = EXCLUDED.updated_at
+            """,
+            rows,
+            page_size=len(rows),
+        )
 
 
-def upsert_aggregates(conn, window: str, metrics: dict[int, dict]) -> None:
+def update_rankings(conn, window: str, scored: ScoredWindow, updated_at: datetime) -> None:
+    if not len(scored):
+        return
+    rows = [
+        (company_id, window, cts_score, cts_score, rank, updated_at)
+        for company_id, cts_score, rank in zip(
+            scored.company_ids.tolist(),
+            scored.cts_score.tolist(),
+            scored.rank.tolist(),
+        )
+    ]
     with conn.cursor() as cur:
-        for company_id, values in metrics.items():
-            cur.execute(
-                """
-                INSERT INTO agg_windows
-                  (company_id, window, complaint_count, one_star_delta, complaint_velocity,
-                   negative_momentum, source_diversity, updated_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (company_id, window) DO UPDATE SET
-                  complaint_count = EXCLUDED.complaint_count,
-                  one_star_delta = EXCLUDED.one_star_delta,
-                  complaint_velocity = EXCLUDED.complaint_velocity,
-                  negative_momentum = EXCLUDED.negative_momentum,
-                  source_diversity = EXCLUDED.source_diversity,
-                  updated_at = EXCLUDED.updated_at
-                """,
-                (
-                    company_id,
-                    window,
-                    values["complaint_count"],
-                    values["one_star_delta"],
-                    values["complaint_velocity"],
-                    values["negative_momentum"],
-                    values["source_diversity"],
-                    values["updated_at"],
-                ),
-            )
+        execute_values(
+            cur,
+            """
+            INSERT INTO rankings (company_id, window, cts_score, delta, rank, updated_at)
+            VALUES %s
+            ON CONFLICT (company_id, window) DO UPDATE SET
+              delta = EXCLUDED.cts_score - rankings.cts_score,
+              cts_score = EXCLUDED.cts_score,
+              rank = EXCLUDED.rank,
+              updated_at = EXCLUDED.updated_at
+            """,
+            rows,
+            page_size=len(rows),
+        )
 
 
-def update_rankings(conn, window: str, metrics: dict[int, dict]) -> None:
-    ranked = sorted(
-        metrics.items(), key=lambda item: item[1]["cts_score"], reverse=True
-    )
+def rerank_window(conn, window: str, changed_ids: list[int]) -> None:
     with conn.cursor() as cur:
-        for idx, (company_id, values) in enumerate(ranked, start=1):
-            cur.execute(
-                """
-                INSERT INTO rankings (company_id, window, cts_score, delta, rank, updated_at)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (company_id, window) DO UPDATE SET
-                  delta = EXCLUDED.cts_score - rankings.cts_score,
-                  cts_score = EXCLUDED.cts_score,
-                  rank = EXCLUDED.rank,
-                  updated_at = EXCLUDED.updated_at
-                """,
-                (
-                    company_id,
-                    window,
-                    values["cts_score"],
-                    values["cts_score"],
-                    idx,
-                    values["updated_at"],
-                ),
-            )
+        cur.execute(
+            """
+            UPDATE rankings r SET
+              rank = ranked.rank,
+              delta = CASE WHEN r.company_id = ANY(%(changed)s) THEN r.delta ELSE 0 END
+            FROM (
+              SELECT
+                  company_id,
+                  ROW_NUMBER() OVER (ORDER BY cts_score DESC, company_id ASC) AS rank
+              FROM rankings
+              WHERE window = %(window)s
+            ) ranked
+            WHERE r.window = %(window)s
+              AND r.company_id = ranked.company_id
+              AND (
+                r.rank <> ranked.rank
+                OR (r.delta <> 0 AND NOT r.company_id = ANY(%(changed)s))
+              )
+            """,
+            {"window": window, "changed": changed_ids},
+        )
 
 
 def cleanup_old_aggregates(conn) -> None:
     cutoff = datetime.utcnow() - timedelta(days=730)
     with conn.cursor() as cur:
         cur.execute(
-            \"\"\"\n            DELETE FROM agg_windows WHERE updated_at < %s\n            \"\"\",\n            (cutoff,),
+            """
+            DELETE FROM agg_windows WHERE updated_at < %s
+            """,
+            (cutoff,),
         )
         cur.execute(
-            \"\"\"\n            DELETE FROM rankings WHERE updated_at < %s\n            \"\"\",\n            (cutoff,),
+            """
+            DELETE FROM rankings WHERE updated_at < %s
+            """,
+            (cutoff,),
         )
 
 
-def run():
+def run(rebuild_hours: int | None = None):
+    with pooled_connection() as conn:
+        run_with_connection(conn, rebuild_hours)
+
+
+def update_rollups(conn, now: datetime, rebuild_hours: int | None) -> Optional[Set[int]]:
+    state = load_rollup_state(conn)
+    xmin = snapshot_xmin(conn)
+    if (
+        rebuild_hours is None
+        and state is not None
+        and state.last_xmin is not None
+        and state.last_run_at is not None
+    ):
+        changed = companies_changed_since(conn, state.last_xmin)
+        changed |= companies_in_buckets(
+            conn, shifted_bucket_ranges(WINDOWS, state.last_run_at, now)
+        )
+        save_rollup_state(conn, xmin, now)
+        return changed
+
+    lookback = rebuild_hours if rebuild_hours is not None else get_settings().rollup_lookback_hours
+    refresh_rollups(conn, floor_hour(now - timedelta(hours=lookback)))
+    save_rollup_state(conn, xmin, now)
+    return None
+
+
+def run_with_connection(conn, rebuild_hours: int | None = None) -> None:
     settings = get_settings()
-    conn = get_connection()
     now = datetime.utcnow()
     source_count = len(settings.source_allowlist) or len(ADAPTERS) or 1
 
-    for window, hours in WINDOWS.items():
-        current_start = now - timedelta(hours=hours)
-        previous_start = now - timedelta(hours=hours * 2)
-
-        current = fetch_metrics(conn, current_start, now)
-        previous = fetch_metrics(conn, previous_start, current_start)
+    with transaction(conn, isolation="REPEATABLE READ"):
+        changed = update_rollups(conn, now, rebuild_hours)
         company_ids = fetch_company_ids(conn)
+        if changed is not None:
+            company_ids = [company_id for company_id in company_ids if company_id in changed]
+            if not company_ids:
+                return
+        window_arrays = fetch_window_arrays(
+            conn, now, WINDOWS, company_ids, restrict=changed is not None
+        )
 
-        metrics: dict[int, dict] = {}
-        for company_id in company_ids:
-            current_metrics = current.get(company_id, WindowMetrics(0, 0, 0, 0))
-            prev_metrics = previous.get(company_id, WindowMetrics(0, 0, 0, 0))
-            one_star_delta = safe_pct_delta(current_metrics.one_star, prev_metrics.one_star)
-            complaint_velocity = safe_pct_delta(current_metrics.total, prev_metrics.total)
-            negative_momentum = safe_pct_delta(current_metrics.negative, prev_metrics.negative)
-            source_diversity = (current_metrics.sources / source_count) * 100.0
-
-            momentum_score = compute_momentum_score(
-                complaint_velocity,
-                negative_momentum,
-                source_diversity,
-            )
+        for window, arrays in window_arrays.items():
+            scored = score_window(arrays, source_count)
+            upsert_aggregates(conn, window, scored, now)
+            update_rankings(conn, window, scored, now)
+            if changed is not None:
+                rerank_window(conn, window, company_ids)
 
-            metrics[company_id] = {
-                "complaint_count": current_metrics.total,
-                "one_star_delta": one_star_delta,
-                "complaint_velocity": complaint_velocity,
-                "negative_momentum": negative_momentum,
-                "source_diversity": source_diversity,
-                "cts_score": momentum_score,
-                "updated_at": now,
-            }
+        cleanup_old_aggregates(conn)
+        cleanup_old_rollups(conn, timedelta(days=90))
 
-        upsert_aggregates(conn, window, metrics)
-        update_rankings(conn, window, metrics)
 
-    cleanup_old_aggregates(conn)
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--rebuild-hours",
+        type=int,
+        default=None,
+        help="Rebuild hourly rollups for the last N hours and recompute every company",
+    )
+    args = parser.parse_args()
+    try:
+        run(args.rebuild_hours)
+    finally:
+        close_pool()
 
 
 if __name__ == "__main__":
-    run()
+    main()
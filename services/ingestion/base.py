@@ -1,19 +1,30 @@
 from __future__ import annotations
 
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List
+from typing import Dict, List
 
 from bs4 import BeautifulSoup
 
-from .browser import BrowserSession
 from .config import Settings
+from .cursors import FetchCursor
 from .dedupe import make_hash
+from .extract import extract_snippets
+from .fetcher import get_fetcher
 from .models import Company, RawEvent
 from .robots import RobotsChecker
 
 
+@dataclass
+class FetchResult:
+    events: List[RawEvent]
+    cursors: List[FetchCursor] = field(default_factory=list)
+
+
 class BaseAdapter:
     source_name: str = ""
+    ready_selector: str | None = None
+    render_js: bool | None = None
 
     def __init__(self, settings: Settings, robots: RobotsChecker):
         self.settings = settings
@@ -28,36 +39,62 @@ class BaseAdapter:
     def parse_events(self, html: str, company: Company, url: str) -> List[RawEvent]:
         return []
 
+    def _planned_urls(self, companies: List[Company], since_ts: datetime | None) -> List[str]:
+        return [
+            url
+            for company in companies
+            for url in self.build_seed_urls(company, since_ts)[: self.settings.max_pages]
+        ]
+
+    def prefetch_robots(self, conn, companies: List[Company], since_ts: datetime | None) -> None:
+        urls = self._planned_urls(companies, since_ts)
+        if urls:
+            self.robots.prefetch(conn, urls)
+
+    def load_host_circuits(
+        self, conn, companies: List[Company], since_ts: datetime | None
+    ) -> None:
+        urls = self._planned_urls(companies, since_ts)
+        if urls:
+            get_fetcher(self.settings).load_hosts(conn, urls)
+
     def fetch_events(self, company: Company, since_ts: datetime | None) -> List[RawEvent]:
         urls = self.build_seed_urls(company, since_ts)
         events: List[RawEvent] = []
 
-        with BrowserSession(self.settings) as browser:
-            for url in urls[: self.settings.max_pages]:
-                if not self.robots.allowed(url):
-                    continue
-                html = browser.fetch_html(url)
-                if not html:
-                    continue
-                events.extend(self.parse_events(html, company, url))
+        fetcher = get_fetcher(self.settings)
+        for url in urls[: self.settings.max_pages]:
+            if not self.robots.allowed(url):
+                continue
+            html = fetcher.fetch_html(url, self.render_js, self.ready_selector)
+            if not html:
+                continue
+            events.extend(self.parse_events(html, company, url))
 
         return events
 
+    def plan_batches(self, companies: List[Company]) -> List[List[Company]]:
+        return [[company] for company in companies]
+
+    def fetch_batch(self, companies: List[Company], since_ts: datetime | None) -> List[RawEvent]:
+        events: List[RawEvent] = []
+        for company in companies:
+            events.extend(self.fetch_events(company, since_ts))
+        return events
+
+    def fetch_incremental(
+        self,
+        companies: List[Company],
+        since_ts: datetime | None,
+        cursors: Dict[int, FetchCursor],
+    ) -> FetchResult:
+        return FetchResult(self.fetch_batch(companies, since_ts))
+
     def soup(self, html: str) -> BeautifulSoup:
         return BeautifulSoup(html, "html.parser")
 
     def extract_snippets(self, html: str, keywords: list[str], limit: int = 5) -> list[str]:
-        soup = self.soup(html)
-        texts = []
-        for tag in soup.find_all(["p", "span", "div", "li"]):
-            text = " ".join(tag.get_text(strip=True).split())
-            if len(text) < 40:
-                continue
-            if any(keyword.lower() in text.lower() for keyword in keywords):
-                texts.append(text)
-            if len(texts) >= limit:
-                break
-        return texts
+        return extract_snippets(html, keywords, limit)
 
     def build_events_from_snippets(self, company: Company, url: str, snippets: list[str]) -> list[RawEvent]:
         events = []
@@ -1,35 +1,210 @@
 from __future__ import annotations
 
-import time
-from playwright.sync_api import sync_playwright
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlparse
+
+from playwright.async_api import (
+    Browser,
+    BrowserContext,
+    Error as PlaywrightError,
+    TimeoutError as PlaywrightTimeoutError,
+    async_playwright,
+)
 
 from .config import Settings
+from .ratelimit import get_host_limiter
+
+
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media"})
+BLOCKED_HOST_SUFFIXES = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "facebook.net",
+    "hotjar.com",
+    "scorecardresearch.com",
+    "quantserve.com",
+)
+
+
+async def _block_heavy_requests(route) -> None:
+    request = route.request
+    host = urlparse(request.url).hostname or ""
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or host.endswith(BLOCKED_HOST_SUFFIXES):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+@dataclass
+class _BrowserHandle:
+    browser: Browser
+    context: BrowserContext
+    pages_served: int = 0
+    active_pages: int = 0
+    retired: bool = False
 
 
-class BrowserSession:
+class BrowserPool:
+    """Process-wide Chromium shared by every adapter and task.
+
+    Playwright objects are bound to the loop that created them, so the pool
+    runs its own loop thread and fetch threads submit pages to it.
+    """
+
     def __init__(self, settings: Settings):
         self.settings = settings
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
         self._playwright = None
-        self._browser = None
+        self._handle: Optional[_BrowserHandle] = None
+        self._launch_lock: Optional[asyncio.Lock] = None
+        self._page_slots: Optional[asyncio.Semaphore] = None
 
-    def __enter__(self):
-        self._playwright = sync_playwright().start()
-        self._browser = self._playwright.chromium.launch(headless=True)
-        return self
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="browser-pool", daemon=True
+                )
+                thread.start()
+                self._loop = loop
+                self._thread = thread
+            return self._loop
 
-    def __exit__(self, exc_type, exc, tb):
-        if self._browser:
-            self._browser.close()
-        if self._playwright:
-            self._playwright.stop()
+    def _run(self, coro):
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    async def _lease(self) -> _BrowserHandle:
+        async with self._launch_lock:
+            handle = self._handle
+            if handle and (handle.retired or not handle.browser.is_connected()):
+                await self._retire(handle)
+                handle = None
+            if handle is None:
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                browser = await self._playwright.chromium.launch(headless=True)
+                context = await browser.new_context(user_agent=self.settings.user_agent)
+                await context.route("**/*", _block_heavy_requests)
+                handle = _BrowserHandle(browser=browser, context=context)
+                self._handle = handle
+            handle.active_pages += 1
+            handle.pages_served += 1
+            if handle.pages_served >= self.settings.browser_recycle_pages:
+                handle.retired = True
+            return handle
+
+    async def _release(self, handle: _BrowserHandle) -> None:
+        handle.active_pages -= 1
+        if handle.retired and handle is not self._handle:
+            await self._close_if_idle(handle)
+
+    async def _retire(self, handle: _BrowserHandle) -> None:
+        handle.retired = True
+        if self._handle is handle:
+            self._handle = None
+        await self._close_if_idle(handle)
 
-    def fetch_html(self, url: str) -> str | None:
-        if not self._browser:
-            raise RuntimeError("Browser not started")
-        page = self._browser.new_page(user_agent=self.settings.user_agent)
+    async def _close_if_idle(self, handle: _BrowserHandle) -> None:
+        if handle.active_pages > 0:
+            return
         try:
-            page.goto(url, timeout=self.settings.request_timeout * 1000)
-            page.wait_for_timeout(self.settings.rate_limit_seconds * 1000)
-            return page.content()
+            await handle.browser.close()
+        except PlaywrightError:
+            pass
+
+    async def _fetch_html(self, url: str, ready_selector: str | None) -> str | None:
+        await self._lease_slot()
+        try:
+            handle = await self._lease()
+            try:
+                page = await handle.context.new_page()
+                try:
+                    await page.goto(
+                        url,
+                        timeout=self.settings.request_timeout * 1000,
+                        wait_until="domcontentloaded",
+                    )
+                    ready_timeout = self.settings.ready_timeout * 1000
+                    try:
+                        if ready_selector:
+                            await page.wait_for_selector(ready_selector, timeout=ready_timeout)
+                        else:
+                            await page.wait_for_load_state("networkidle", timeout=ready_timeout)
+                    except PlaywrightTimeoutError:
+                        pass
+                    return await page.content()
+                finally:
+                    await page.close()
+            except PlaywrightError:
+                if not handle.browser.is_connected():
+                    await self._retire(handle)
+                raise
+            finally:
+                await self._release(handle)
         finally:
-            page.close()
+            self._page_slots.release()
+
+    async def _lease_slot(self) -> None:
+        if self._page_slots is None:
+            self._page_slots = asyncio.Semaphore(max(1, self.settings.browser_max_pages))
+            self._launch_lock = asyncio.Lock()
+        await self._page_slots.acquire()
+
+    async def _shutdown(self) -> None:
+        if self._handle:
+            handle = self._handle
+            self._handle = None
+            handle.active_pages = 0
+            await self._close_if_idle(handle)
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+
+    def fetch_html(
+        self, url: str, ready_selector: str | None = None, acquire: bool = True
+    ) -> str | None:
+        if acquire:
+            get_host_limiter(self.settings).acquire(url)
+        return self._run(self._fetch_html(url, ready_selector))
+
+    def close(self) -> None:
+        with self._lock:
+            loop = self._loop
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        if self._thread:
+            self._thread.join(timeout=5)
+        with self._lock:
+            self._loop = None
+            self._thread = None
+
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool(settings: Settings) -> BrowserPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(settings)
+        return _pool
+
+
+def close_browser_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool:
+        pool.close()
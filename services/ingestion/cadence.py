@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from .config import Settings
+from .cursors import as_naive_utc
+
+
+# Buckets older than this many half-lives add under 4% to the rate and are skipped.
+HORIZON_HALF_LIVES = 5
+# Rows are only rewritten when their rate moves by more than this fraction, so
+# steady decay does not dirty every active row on every tick.
+ACTIVITY_TOLERANCE = 0.01
+
+
+@dataclass
+class CrawlSlot:
+    source: str
+    company_id: int
+    activity: float
+    last_polled_at: Optional[datetime]
+
+
+def poll_interval(activity: float, settings: Settings) -> timedelta:
+    minimum = settings.crawl_min_interval_minutes
+    maximum = max(minimum, settings.crawl_max_interval_minutes)
+    if activity <= 0:
+        return timedelta(minutes=maximum)
+    minutes = 60.0 * settings.crawl_target_events / activity
+    return timedelta(minutes=min(maximum, max(minimum, minutes)))
+
+
+def update_activity(
+    conn,
+    sources: Iterable[str],
+    company_ids: Iterable[int],
+    now: datetime,
+    settings: Settings,
+) -> None:
+    """Recompute each pair's activity from the hourly rollups.
+
+    activity is an events-per-hour rate where each bucket's events are
+    weighted by 0.5 ** (age / CRAWL_HALF_LIFE_HOURS). The rollups commit
+    with the events, so nothing depends on the order writers committed in.
+    """
+    sources = list(sources)
+    company_ids = list(company_ids)
+    half_life = max(settings.crawl_half_life_hours, 1.0 / 60)
+
+    with conn.cursor() as cur:
+        execute_values(
+            cur,
+            """
+            INSERT INTO crawl_schedule (source, company_id)
+            VALUES %s
+            ON CONFLICT (source, company_id) DO NOTHING
+            """,
+            [(source, company_id) for source in sources for company_id in company_ids],
+            page_size=1000,
+        )
+        cur.execute(
+            """
+            UPDATE crawl_schedule AS schedule
+            SET activity = fresh.activity, updated_at = NOW()
+            FROM (
+              SELECT pair.source, pair.company_id, COALESCE(rates.activity, 0) AS activity
+              FROM crawl_schedule AS pair
+              LEFT JOIN (
+                SELECT
+                    source,
+                    company_id,
+                    SUM(
+                      total * POWER(
+                        0.5,
+                        GREATEST(
+                          EXTRACT(EPOCH FROM (%(now)s::timestamptz - bucket)) / 3600.0 - 0.5,
+                          0
+                        ) / %(half_life)s
+                      )
+                    ) * LN(2) / %(half_life)s AS activity
+                FROM event_rollups_hourly
+                WHERE bucket >= %(since)s
+                GROUP BY source, company_id
+              ) AS rates
+                ON rates.source = pair.source AND rates.company_id = pair.company_id
+            ) AS fresh
+            WHERE schedule.source = fresh.source AND schedule.company_id = fresh.company_id
+              AND ABS(schedule.activity - fresh.activity)
+                  > %(tolerance)s * GREATEST(schedule.activity, fresh.activity)
+            """,
+            {
+                "now": now,
+                "half_life": half_life,
+                "since": now - timedelta(hours=half_life * HORIZON_HALF_LIVES),
+                "tolerance": ACTIVITY_TOLERANCE,
+            },
+        )
+
+
+def fetch_slots(conn, sources: Iterable[str], company_ids: Iterable[int]) -> List[CrawlSlot]:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT source, company_id, activity, last_polled_at
+            FROM crawl_schedule
+            WHERE source = ANY(%s) AND company_id = ANY(%s)
+            """,
+            (list(sources), list(company_ids)),
+        )
+        rows = cur.fetchall()
+    return [
+        CrawlSlot(
+            source=source,
+            company_id=company_id,
+            activity=activity,
+            last_polled_at=as_naive_utc(last_polled_at),
+        )
+        for source, company_id, activity, last_polled_at in rows
+    ]
+
+
+def select_due(slots: List[CrawlSlot], now: datetime, settings: Settings) -> List[CrawlSlot]:
+    """Pick the pairs to poll this tick, most overdue first, within each source's budget."""
+    by_source: Dict[str, List[Tuple[float, CrawlSlot]]] = {}
+    for slot in slots:
+        if slot.last_polled_at is None:
+            overdue = math.inf
+        else:
+            interval = poll_interval(slot.activity, settings).total_seconds()
+            overdue = (now - slot.last_polled_at).total_seconds() / interval
+            if overdue < 1.0:
+                continue
+        by_source.setdefault(slot.source, []).append((overdue, slot))
+
+    selected: List[CrawlSlot] = []
+    for source, candidates in by_source.items():
+        candidates.sort(key=lambda item: (-item[0], -item[1].activity, item[1].company_id))
+        budget = settings.crawl_budget_for(source)
+        selected.extend(slot for _, slot in candidates[: budget if budget > 0 else None])
+    return selected
+
+
+def mark_polled(conn, slots: List[CrawlSlot], now: datetime) -> None:
+    if not slots:
+        return
+    with conn.cursor() as cur:
+        execute_values(
+            cur,
+            """
+            UPDATE crawl_schedule AS schedule
+            SET last_polled_at = data.polled_at
+            FROM (VALUES %s) AS data (source, company_id, polled_at)
+            WHERE schedule.source = data.source AND schedule.company_id = data.company_id
+            """,
+            [(slot.source, slot.company_id, now) for slot in slots],
+            template="(%s, %s, %s::timestamptz)",
+            page_size=len(slots),
+        )
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .config import Settings
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with exponential backoff.
+
+    After ``threshold`` failures in a row the circuit opens and ``allow``
+    rejects calls until ``opened_until``. The first call after that is a
+    probe; concurrent callers wait for its outcome, which either closes the
+    circuit or reopens it with a doubled backoff.
+
+    ``allow`` returns a ticket naming the period the call started in, and
+    outcomes reported with a ticket from an earlier period are ignored, so a
+    slow call that was let through before the circuit opened cannot close it.
+    """
+
+    def __init__(
+        self,
+        threshold: int,
+        backoff_seconds: float,
+        max_backoff_seconds: float,
+        state: str = CLOSED,
+        opened_until: Optional[float] = None,
+        trips: int = 0,
+    ):
+        self.threshold = max(1, threshold)
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max(backoff_seconds, max_backoff_seconds)
+        self.state = OPEN if state == HALF_OPEN else state
+        self.opened_until = opened_until or 0.0
+        self.trips = trips
+        self.failures = 0
+        self.changed = False
+        self.generation = 0
+        self._probing = False
+        self._cond = threading.Condition()
+
+    def retry_in(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_until - time.time())
+
+    def allow(self) -> Optional[int]:
+        """Return a ticket for the call, or None if the circuit rejects it."""
+        with self._cond:
+            while True:
+                if self.state == CLOSED:
+                    return self.generation
+                if self.state == OPEN:
+                    if time.time() < self.opened_until:
+                        return None
+                    self.state = HALF_OPEN
+                    self.generation += 1
+                    self._probing = True
+                    return self.generation
+                if not self._probing:
+                    self._probing = True
+                    return self.generation
+                self._cond.wait()
+
+    def record_success(self, ticket: int) -> None:
+        with self._cond:
+            if ticket != self.generation:
+                return
+            if self.state != CLOSED or self.trips:
+                self.changed = True
+            self.state = CLOSED
+            self.failures = 0
+            self.trips = 0
+            self._probing = False
+            self._cond.notify_all()
+
+    def record_failure(self, ticket: int) -> None:
+        with self._cond:
+            if ticket != self.generation:
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or (
+                self.state == CLOSED and self.failures >= self.threshold
+            ):
+                self.trips += 1
+                backoff = self.backoff_seconds * 2 ** (self.trips - 1)
+                self.opened_until = time.time() + min(self.max_backoff_seconds, backoff)
+                self.state = OPEN
+                self.generation += 1
+                self.failures = 0
+                self.changed = True
+            self._probing = False
+            self._cond.notify_all()
+
+    def adopt(self, state: str, opened_until: Optional[float], trips: int) -> None:
+        """Take over state another worker stored, unless a probe is in flight here."""
+        with self._cond:
+            state = OPEN if state == HALF_OPEN else state
+            opened_until = opened_until or 0.0
+            if self._probing or self.changed:
+                return
+            if state == self.state and opened_until == self.opened_until:
+                return
+            self.generation += 1
+            self.state = state
+            self.opened_until = opened_until
+            self.trips = trips
+            self.failures = 0
+            self._cond.notify_all()
+
+
+def build_breaker(settings: Settings, **state) -> CircuitBreaker:
+    return CircuitBreaker(
+        settings.circuit_failure_threshold,
+        settings.circuit_backoff_seconds,
+        settings.circuit_max_backoff_seconds,
+        **state,
+    )
+
+
+class HostBreakers:
+    """One breaker per host, shared with other workers through source_health."""
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, host: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = build_breaker(self.settings)
+                self._breakers[host] = breaker
+            return breaker
+
+    def changed(self) -> List[Tuple[str, CircuitBreaker]]:
+        with self._lock:
+            return [(host, breaker) for host, breaker in self._breakers.items() if breaker.changed]
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
-from typing import List
+import threading
+import time
+from typing import List, Optional
 
-from .models import Company
+from .config import Settings
+from .models import Company, Task
 
 
 def fetch_companies(conn) -> List[Company]:
@@ -27,3 +30,63 @@ def fetch_companies(conn) -> List[Company]:
         )
         for row in rows
     ]
+
+
+def select_shard(companies: List[Company], task: Task) -> List[Company]:
+    selected = companies
+    if task.company_ids is not None:
+        wanted = set(task.company_ids)
+        selected = [company for company in selected if company.id in wanted]
+    if task.min_company_id is not None:
+        selected = [company for company in selected if company.id >= task.min_company_id]
+    if task.max_company_id is not None:
+        selected = [company for company in selected if company.id <= task.max_company_id]
+    return selected
+
+
+def shard_ranges(
+    companies: List[Company], shard_size: int
+) -> list[tuple[Optional[int], Optional[int]]]:
+    ids = sorted(company.id for company in companies)
+    if shard_size <= 0 or not ids:
+        return []
+    starts = list(range(0, len(ids), shard_size))
+    return [
+        (
+            ids[start] if idx > 0 else None,
+            ids[start + shard_size] - 1 if idx < len(starts) - 1 else None,
+        )
+        for idx, start in enumerate(starts)
+    ]
+
+
+class CompanyCatalog:
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._companies: List[Company] = []
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def get(self, conn) -> List[Company]:
+        with self._lock:
+            now = time.monotonic()
+            if self._loaded_at is None or now - self._loaded_at >= self.ttl_seconds:
+                self._companies = fetch_companies(conn)
+                self._loaded_at = now
+            return list(self._companies)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+
+_catalog: Optional[CompanyCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_company_catalog(settings: Settings) -> CompanyCatalog:
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = CompanyCatalog(settings.company_cache_seconds)
+        return _catalog
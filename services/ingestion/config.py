@@ -10,40 +10,149 @@ def _split_csv(value: str | None) -> list[str]:
     return [item.strip() for item in value.split(",") if item.strip()]
 
 
+def _split_int_map(value: str | None) -> dict[str, int]:
+    result: dict[str, int] = {}
+    for item in _split_csv(value):
+        key, _, raw = item.partition("=")
+        if key.strip() and raw.strip():
+            result[key.strip()] = int(raw)
+    return result
+
+
 @dataclass(frozen=True)
 class Settings:
     database_url: str
     database_ssl: bool
+    db_pool_min: int
+    db_pool_max: int
+    db_healthcheck_seconds: float
+    company_cache_seconds: float
     aws_region: str
     sqs_queue_url: str
+    worker_concurrency: int
+    visibility_timeout: int
+    heartbeat_seconds: float
+    idle_sleep_seconds: float
+    shard_size: int
+    crawl_half_life_hours: float
+    crawl_min_interval_minutes: float
+    crawl_max_interval_minutes: float
+    crawl_target_events: float
+    crawl_budget: int
+    crawl_budgets: dict[str, int]
+    queue_prefetch: int
+    queue_wait_seconds: int
+    queue_batch_retries: int
+    local_queue_path: str
     source_allowlist: list[str]
     user_agent: str
     request_timeout: int
     max_pages: int
     rate_limit_seconds: float
+    robots_ttl_seconds: int
+    robots_failure_ttl_seconds: int
+    circuit_failure_threshold: int
+    circuit_backoff_seconds: float
+    circuit_max_backoff_seconds: float
+    host_rate_burst: int
+    ready_timeout: float
     log_level: str
     reddit_client_id: str
     reddit_client_secret: str
     reddit_user_agent: str
     x_bearer_token: str
     quora_api_key: str
+    fetch_concurrency: int
+    source_concurrency: dict[str, int]
+    browser_max_pages: int
+    http_pool_hosts: int
+    http_pool_size: int
+    min_static_text_chars: int
+    token_refresh_margin: float
+    http_cache_dir: str
+    http_cache_max_mb: int
+    api_batch_size: int
+    reddit_query_max_length: int
+    x_query_max_length: int
+    cursor_max_pages: int
+    enrich_workers: int
+    enrich_batch_size: int
+    dedupe_cache_size: int
+    dedupe_warm_hours: int
+    bulk_flush_rows: int
+    bulk_flush_seconds: float
+    rollup_lookback_hours: int
+    browser_recycle_pages: int
+
+    def concurrency_for(self, source: str) -> int:
+        return max(1, self.source_concurrency.get(source, self.fetch_concurrency))
+
+    def crawl_budget_for(self, source: str) -> int:
+        return self.crawl_budgets.get(source, self.crawl_budget)
 
 
 def get_settings() -> Settings:
     return Settings(
         database_url=os.environ.get("DATABASE_URL", ""),
         database_ssl=os.environ.get("DATABASE_SSL", "false").lower() == "true",
+        db_pool_min=int(os.environ.get("DB_POOL_MIN", "1")),
+        db_pool_max=int(os.environ.get("DB_POOL_MAX", "8")),
+        db_healthcheck_seconds=float(os.environ.get("DB_HEALTHCHECK_SECONDS", "30")),
+        company_cache_seconds=float(os.environ.get("COMPANY_CACHE_SECONDS", "300")),
         aws_region=os.environ.get("AWS_REGION", "ap-south-1"),
         sqs_queue_url=os.environ.get("SQS_QUEUE_URL", ""),
+        worker_concurrency=int(os.environ.get("WORKER_CONCURRENCY", "2")),
+        visibility_timeout=int(os.environ.get("VISIBILITY_TIMEOUT", "300")),
+        heartbeat_seconds=float(os.environ.get("HEARTBEAT_SECONDS", "60")),
+        idle_sleep_seconds=float(os.environ.get("IDLE_SLEEP_SECONDS", "5")),
+        shard_size=int(os.environ.get("SHARD_SIZE", "25")),
+        crawl_half_life_hours=float(os.environ.get("CRAWL_HALF_LIFE_HOURS", "24")),
+        crawl_min_interval_minutes=float(os.environ.get("CRAWL_MIN_INTERVAL_MINUTES", "5")),
+        crawl_max_interval_minutes=float(os.environ.get("CRAWL_MAX_INTERVAL_MINUTES", "1440")),
+        crawl_target_events=float(os.environ.get("CRAWL_TARGET_EVENTS", "1")),
+        crawl_budget=int(os.environ.get("CRAWL_BUDGET", "0")),
+        crawl_budgets=_split_int_map(os.environ.get("CRAWL_BUDGETS")),
+        queue_prefetch=int(os.environ.get("QUEUE_PREFETCH", "2")),
+        queue_wait_seconds=int(os.environ.get("QUEUE_WAIT_SECONDS", "20")),
+        queue_batch_retries=int(os.environ.get("QUEUE_BATCH_RETRIES", "3")),
+        local_queue_path=os.environ.get("LOCAL_QUEUE_PATH", ".ingestion/queue.sqlite3"),
         source_allowlist=_split_csv(os.environ.get("SOURCE_ALLOWLIST")),
         user_agent=os.environ.get("USER_AGENT", "YendukuBot/1.0"),
         request_timeout=int(os.environ.get("REQUEST_TIMEOUT", "20")),
         max_pages=int(os.environ.get("MAX_PAGES", "2")),
         rate_limit_seconds=float(os.environ.get("RATE_LIMIT_SECONDS", "2")),
+        robots_ttl_seconds=int(os.environ.get("ROBOTS_TTL_SECONDS", "3600")),
+        robots_failure_ttl_seconds=int(os.environ.get("ROBOTS_FAILURE_TTL_SECONDS", "600")),
+        circuit_failure_threshold=int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5")),
+        circuit_backoff_seconds=float(os.environ.get("CIRCUIT_BACKOFF_SECONDS", "60")),
+        circuit_max_backoff_seconds=float(os.environ.get("CIRCUIT_MAX_BACKOFF_SECONDS", "1800")),
+        host_rate_burst=int(os.environ.get("HOST_RATE_BURST", "1")),
+        ready_timeout=float(os.environ.get("READY_TIMEOUT", "5")),
         log_level=os.environ.get("LOG_LEVEL", "INFO"),
         reddit_client_id=os.environ.get("REDDIT_CLIENT_ID", ""),
         reddit_client_secret=os.environ.get("REDDIT_CLIENT_SECRET", ""),
         reddit_user_agent=os.environ.get("REDDIT_USER_AGENT", ""),
         x_bearer_token=os.environ.get("X_BEARER_TOKEN", ""),
         quora_api_key=os.environ.get("QUORA_API_KEY", ""),
+        fetch_concurrency=int(os.environ.get("FETCH_CONCURRENCY", "4")),
+        source_concurrency=_split_int_map(os.environ.get("SOURCE_CONCURRENCY")),
+        browser_max_pages=int(os.environ.get("BROWSER_MAX_PAGES", "4")),
+        http_pool_hosts=int(os.environ.get("HTTP_POOL_HOSTS", "32")),
+        http_pool_size=int(os.environ.get("HTTP_POOL_SIZE", "16")),
+        min_static_text_chars=int(os.environ.get("MIN_STATIC_TEXT_CHARS", "500")),
+        token_refresh_margin=float(os.environ.get("TOKEN_REFRESH_MARGIN", "60")),
+        http_cache_dir=os.environ.get("HTTP_CACHE_DIR", ".ingestion/http-cache"),
+        http_cache_max_mb=int(os.environ.get("HTTP_CACHE_MAX_MB", "256")),
+        api_batch_size=int(os.environ.get("API_BATCH_SIZE", "10")),
+        reddit_query_max_length=int(os.environ.get("REDDIT_QUERY_MAX_LENGTH", "512")),
+        x_query_max_length=int(os.environ.get("X_QUERY_MAX_LENGTH", "512")),
+        cursor_max_pages=int(os.environ.get("CURSOR_MAX_PAGES", "10")),
+        enrich_workers=int(os.environ.get("ENRICH_WORKERS", str(os.cpu_count() or 1))),
+        enrich_batch_size=int(os.environ.get("ENRICH_BATCH_SIZE", "64")),
+        dedupe_cache_size=int(os.environ.get("DEDUPE_CACHE_SIZE", "200000")),
+        dedupe_warm_hours=int(os.environ.get("DEDUPE_WARM_HOURS", "72")),
+        bulk_flush_rows=int(os.environ.get("BULK_FLUSH_ROWS", "1000")),
+        bulk_flush_seconds=float(os.environ.get("BULK_FLUSH_SECONDS", "5")),
+        rollup_lookback_hours=int(os.environ.get("ROLLUP_LOOKBACK_HOURS", "3")),
+        browser_recycle_pages=int(os.environ.get("BROWSER_RECYCLE_PAGES", "200")),
     )
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+
+@dataclass
+class FetchCursor:
+    """Newest item already stored for one (source, company).
+
+    last_item_id holds the source's own position marker: the tweet id for X,
+    the post fullname for Reddit and the entry id for RSS.
+
+    When a run runs out of pages before reaching the stored position, the
+    position stays put, resume_item_id records the oldest item fetched so the
+    next run pages on from there, and pending_* holds the newest item, which
+    becomes the position once the gap is closed.
+    """
+
+    source: str
+    company_id: int
+    last_seen_at: Optional[datetime] = None
+    last_item_id: Optional[str] = None
+    resume_item_id: Optional[str] = None
+    pending_seen_at: Optional[datetime] = None
+    pending_item_id: Optional[str] = None
+
+
+def as_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def newer_cursor(current: Optional[FetchCursor], candidate: FetchCursor) -> FetchCursor:
+    if current is None or current.last_seen_at is None:
+        return candidate
+    if candidate.last_seen_at is None or candidate.last_seen_at < current.last_seen_at:
+        return current
+    return candidate
+
+
+def load_cursors(conn, source: str, company_ids: Iterable[int]) -> Dict[int, FetchCursor]:
+    ids = list(company_ids)
+    if not ids:
+        return {}
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT company_id, last_seen_at, last_item_id,
+                   resume_item_id, pending_seen_at, pending_item_id
+            FROM fetch_cursors
+            WHERE source = %s AND company_id = ANY(%s)
+            """,
+            (source, ids),
+        )
+        rows = cur.fetchall()
+    return {
+        company_id: FetchCursor(
+            source=source,
+            company_id=company_id,
+            last_seen_at=as_naive_utc(last_seen_at),
+            last_item_id=last_item_id,
+            resume_item_id=resume_item_id,
+            pending_seen_at=as_naive_utc(pending_seen_at),
+            pending_item_id=pending_item_id,
+        )
+        for (
+            company_id,
+            last_seen_at,
+            last_item_id,
+            resume_item_id,
+            pending_seen_at,
+            pending_item_id,
+        ) in rows
+    }
+
+
+def save_cursors(conn, cursors: Iterable[FetchCursor]) -> None:
+    merged: Dict[Tuple[str, int], FetchCursor] = {}
+    for cursor in cursors:
+        key = (cursor.source, cursor.company_id)
+        merged[key] = newer_cursor(merged.get(key), cursor)
+    rows: List[tuple] = [
+        (
+            cursor.source,
+            cursor.company_id,
+            cursor.last_seen_at,
+            cursor.last_item_id,
+            cursor.resume_item_id,
+            cursor.pending_seen_at,
+            cursor.pending_item_id,
+        )
+        for cursor in merged.values()
+    ]
+    if not rows:
+        return
+    with conn.cursor() as cur:
+        execute_values(
+            cur,
+            """
+            INSERT INTO fetch_cursors
+              (source, company_id, last_seen_at, last_item_id,
+               resume_item_id, pending_seen_at, pending_item_id)
+            VALUES %s
+            ON CONFLICT (source, company_id) DO UPDATE SET
+              last_seen_at = EXCLUDED.last_seen_at,
+              last_item_id = EXCLUDED.last_item_id,
+              resume_item_id = EXCLUDED.resume_item_id,
+              pending_seen_at = EXCLUDED.pending_seen_at,
+              pending_item_id = EXCLUDED.pending_item_id,
+              updated_at = NOW()
+            WHERE fetch_cursors.last_seen_at IS NULL
+               OR EXCLUDED.last_seen_at >= fetch_cursors.last_seen_at
+            """,
+            rows,
+            page_size=len(rows),
+        )
+
+
+def shared_resume(
+    cursors: Dict[int, FetchCursor], company_ids: Iterable[int]
+) -> Optional[FetchCursor]:
+    """The unfinished catch-up every company in the batch belongs to, if any."""
+    positions = [cursors.get(company_id) for company_id in company_ids]
+    first = positions[0] if positions else None
+    if first is None or not first.resume_item_id:
+        return None
+    if all(
+        position
+        and position.resume_item_id == first.resume_item_id
+        and position.pending_item_id == first.pending_item_id
+        for position in positions
+    ):
+        return first
+    return None
+
+
+def advance_cursors(
+    source: str,
+    company_ids: Iterable[int],
+    cursors: Dict[int, FetchCursor],
+    since_ts: Optional[datetime],
+    resume: Optional[FetchCursor],
+    reached: bool,
+    newest: Optional[Tuple[datetime, str]],
+    oldest_item_id: Optional[str],
+) -> List[FetchCursor]:
+    """Cursors to store after paging a batch from ``newest`` down to ``oldest_item_id``.
+
+    Positions only move to the newest item once paging reached them. Until
+    then each company keeps its position and records where to resume.
+    """
+    if resume is not None:
+        newest = (resume.pending_seen_at, resume.pending_item_id)
+    if newest is None or not newest[1]:
+        return []
+    if reached:
+        return [
+            FetchCursor(
+                source=source,
+                company_id=company_id,
+                last_seen_at=newest[0],
+                last_item_id=newest[1],
+            )
+            for company_id in company_ids
+        ]
+    resume_item_id = oldest_item_id or (resume.resume_item_id if resume else None)
+    if not resume_item_id:
+        return []
+    advanced: List[FetchCursor] = []
+    for company_id in company_ids:
+        cursor = cursors.get(company_id)
+        has_position = cursor is not None and cursor.last_seen_at is not None
+        advanced.append(
+            FetchCursor(
+                source=source,
+                company_id=company_id,
+                last_seen_at=cursor.last_seen_at if has_position else since_ts,
+                last_item_id=cursor.last_item_id if has_position else None,
+                resume_item_id=resume_item_id,
+                pending_seen_at=newest[0],
+                pending_item_id=newest[1],
+            )
+        )
+    return advanced
@@ -1,11 +1,17 @@
 from __future__ import annotations
 
-from typing import Iterable, Tuple
+import csv
+import io
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 import psycopg2
-from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 
-from .config import get_settings
+from .config import Settings, get_settings
+from .cursors import FetchCursor, newer_cursor, save_cursors
 from .models import RawEvent
 
 
@@ -22,61 +28,277 @@ def get_connection():
     return conn
 
 
-def insert_events_with_sentiment(conn, events: Iterable[EventWithSentiment]) -> int:
-    payload = list(events)
-    if not payload:
-        return 0
-
-    raw_rows = [
-        (
-            item[0].source,
-            item[0].company_id,
-            item[0].url,
-            item[0].text,
-            item[0].rating,
-            item[0].language,
-            item[0].created_at,
-            item[0].hash,
+class ConnectionPool:
+    def __init__(self, settings: Settings):
+        if not settings.database_url:
+            raise RuntimeError("DATABASE_URL is required")
+        sslmode = "require" if settings.database_ssl else "prefer"
+        self.healthcheck_seconds = settings.db_healthcheck_seconds
+        self._pool = ThreadedConnectionPool(
+            settings.db_pool_min,
+            settings.db_pool_max,
+            settings.database_url,
+            sslmode=sslmode,
         )
-        for item in payload
-    ]
+        self._slots = threading.BoundedSemaphore(settings.db_pool_max)
+        self._last_used: dict[int, float] = {}
+
+    def _healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.healthcheck_seconds:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout(self):
+        # Switch to autocommit before probing so SELECT 1 never opens a transaction.
+        conn = self._pool.getconn()
+        try:
+            conn.autocommit = True
+            if self._healthy(conn):
+                return conn
+        except psycopg2.Error:
+            pass
+        self._release(conn, discard=True)
+        conn = self._pool.getconn()
+        try:
+            conn.autocommit = True
+        except psycopg2.Error:
+            self._release(conn, discard=True)
+            raise
+        return conn
+
+    def _release(self, conn, discard: bool = False) -> None:
+        if discard or conn.closed:
+            self._last_used.pop(id(conn), None)
+            self._pool.putconn(conn, close=True)
+            return
+        self._last_used[id(conn)] = time.monotonic()
+        self._pool.putconn(conn)
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            conn = self._checkout()
+            broken = False
+            try:
+                yield conn
+            except (psycopg2.InterfaceError, psycopg2.OperationalError):
+                broken = True
+                raise
+            finally:
+                self._release(conn, discard=broken)
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        self._pool.closeall()
+
 
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(get_settings())
+        return _pool
+
+
+@contextmanager
+def pooled_connection():
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool:
+        pool.close()
+
+
+@contextmanager
+def transaction(conn, isolation: Optional[str] = None):
+    if not conn.autocommit:
+        with conn:
+            yield conn
+        return
     with conn.cursor() as cur:
-        execute_values(
-            cur,
-            """
-            INSERT INTO raw_events
-              (source, company_id, url, text, rating, language, created_at, hash)
-            VALUES %s
-            ON CONFLICT (hash) DO NOTHING
-            RETURNING id, hash
-            """,
-            raw_rows,
-        )
-        inserted = cur.fetchall()
+        cur.execute(f"BEGIN ISOLATION LEVEL {isolation}" if isolation else "BEGIN")
+    try:
+        yield conn
+    except Exception:
+        if not conn.closed:
+            with conn.cursor() as cur:
+                cur.execute("ROLLBACK")
+        raise
+    with conn.cursor() as cur:
+        cur.execute("COMMIT")
 
-    if not inserted:
-        return 0
 
-    id_by_hash = {row[1]: row[0] for row in inserted}
-    sentiment_rows = []
+def _staging_csv(payload: List[EventWithSentiment]) -> io.StringIO:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
     for event, sentiment_score, is_negative in payload:
-        event_id = id_by_hash.get(event.hash)
-        if event_id is None:
-            continue
-        sentiment_rows.append((event_id, sentiment_score, is_negative))
+        writer.writerow(
+            [
+                event.source,
+                event.company_id,
+                event.url,
+                event.text,
+                "" if event.rating is None else event.rating,
+                event.language or "",
+                event.created_at.isoformat(),
+                event.hash,
+                sentiment_score,
+                "t" if is_negative else "f",
+            ]
+        )
+    buffer.seek(0)
+    return buffer
 
-    if sentiment_rows:
+
+def insert_events_with_sentiment(
+    conn,
+    events: Iterable[EventWithSentiment],
+    cursors: Iterable[FetchCursor] = (),
+) -> int:
+    payload = list(events)
+    cursors = list(cursors)
+    if not payload:
+        if cursors:
+            with transaction(conn):
+                save_cursors(conn, cursors)
+        return 0
+
+    with transaction(conn):
+        save_cursors(conn, cursors)
         with conn.cursor() as cur:
-            execute_values(
-                cur,
+            cur.execute(
+                """
+                CREATE TEMP TABLE staging_events (
+                  source TEXT NOT NULL,
+                  company_id INTEGER NOT NULL,
+                  url TEXT NOT NULL,
+                  text TEXT NOT NULL,
+                  rating NUMERIC,
+                  language TEXT,
+                  created_at TIMESTAMPTZ NOT NULL,
+                  hash TEXT NOT NULL,
+                  sentiment_score DOUBLE PRECISION NOT NULL,
+                  is_negative BOOLEAN NOT NULL
+                ) ON COMMIT DROP
                 """
-                INSERT INTO sentiment_events
-                  (raw_event_id, sentiment_score, is_negative)
-                VALUES %s
-                ON CONFLICT (raw_event_id) DO NOTHING
+            )
+            cur.copy_expert(
+                """
+                COPY staging_events
+                  (source, company_id, url, text, rating, language, created_at, hash,
+                   sentiment_score, is_negative)
+                FROM STDIN WITH (FORMAT csv)
                 """,
-                sentiment_rows,
+                _staging_csv(payload),
+            )
+            cur.execute(
+                """
+                WITH staged AS (
+                  SELECT DISTINCT ON (hash) *
+                  FROM staging_events
+                  ORDER BY hash
+                ), inserted AS (
+                  INSERT INTO raw_events
+                    (source, company_id, url, text, rating, language, created_at, hash)
+                  SELECT source, company_id, url, text, rating, language, created_at, hash
+                  FROM staged
+                  ON CONFLICT (hash) DO NOTHING
+                  RETURNING id, hash
+                ), scored AS (
+                  INSERT INTO sentiment_events (raw_event_id, sentiment_score, is_negative)
+                  SELECT inserted.id, staged.sentiment_score, staged.is_negative
+                  FROM inserted
+                  JOIN staged ON staged.hash = inserted.hash
+                  ON CONFLICT (raw_event_id) DO NOTHING
+                ), rolled AS (
+                  INSERT INTO event_rollups_hourly
+                    (bucket, company_id, source, total, one_star, negative)
+                  SELECT
+                      date_trunc('hour', staged.created_at),
+                      staged.company_id,
+                      staged.source,
+                      COUNT(*),
+                      COUNT(*) FILTER (WHERE staged.rating IS NOT NULL AND staged.rating <= 1),
+                      COUNT(*) FILTER (WHERE staged.is_negative)
+                  FROM inserted
+                  JOIN staged ON staged.hash = inserted.hash
+                  GROUP BY 1, 2, 3
+                  ORDER BY 1, 2, 3
+                  ON CONFLICT (bucket, company_id, source) DO UPDATE SET
+                    total = event_rollups_hourly.total + EXCLUDED.total,
+                    one_star = event_rollups_hourly.one_star + EXCLUDED.one_star,
+                    negative = event_rollups_hourly.negative + EXCLUDED.negative,
+                    updated_at = NOW(),
+                    updated_xid = pg_current_xact_id()::text::bigint
+                )
+                SELECT COUNT(*) FROM inserted
+                """
             )
+            row = cur.fetchone()
+    return row[0] if row else 0
+
+
+class BulkEventWriter:
+    def __init__(
+        self,
+        conn,
+        flush_rows: int,
+        flush_seconds: float,
+        on_flush: Optional[Callable[[List[EventWithSentiment], int], None]] = None,
+    ):
+        self.conn = conn
+        self.flush_rows = max(1, flush_rows)
+        self.flush_seconds = flush_seconds
+        self.on_flush = on_flush
+        self._buffer: List[EventWithSentiment] = []
+        self._cursors: Dict[Tuple[str, int], FetchCursor] = {}
+        self._first_buffered_at: Optional[float] = None
+
+    def add(
+        self, events: Iterable[EventWithSentiment], cursors: Iterable[FetchCursor] = ()
+    ) -> int:
+        for item in events:
+            if self._first_buffered_at is None:
+                self._first_buffered_at = time.monotonic()
+            self._buffer.append(item)
+        for cursor in cursors:
+            if self._first_buffered_at is None:
+                self._first_buffered_at = time.monotonic()
+            key = (cursor.source, cursor.company_id)
+            self._cursors[key] = newer_cursor(self._cursors.get(key), cursor)
+        if len(self._buffer) >= self.flush_rows or (
+            self._first_buffered_at is not None
+            and time.monotonic() - self._first_buffered_at >= self.flush_seconds
+        ):
+            return self.flush()
+        return 0
 
-    return len(inserted)
+    def flush(self) -> int:
+        payload, self._buffer = self._buffer, []
+        cursors, self._cursors = list(self._cursors.values()), {}
+        self._first_buffered_at = None
+        if not payload and not cursors:
+            return 0
+        inserted = insert_events_with_sentiment(self.conn, payload, cursors)
+        if self.on_flush:
+            self.on_flush(payload, inserted)
+        return inserted
@@ -1,6 +1,77 @@
+from __future__ import annotations
+
 import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from .config import Settings
+from .models import RawEvent
 
 
 def make_hash(source: str, url: str, text: str) -> str:
     payload = f"{source}|{url}|{text}".encode("utf-8")
     return hashlib.sha256(payload).hexdigest()
+
+
+class SeenHashes:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._hashes: OrderedDict[str, None] = OrderedDict()
+        self._lock = threading.Lock()
+        self.warmed = False
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add_many(self, hashes: Iterable[str]) -> None:
+        with self._lock:
+            for value in hashes:
+                self._hashes[value] = None
+                self._hashes.move_to_end(value)
+            while len(self._hashes) > self.max_size:
+                self._hashes.popitem(last=False)
+
+    def filter_new(self, events: List[RawEvent]) -> List[RawEvent]:
+        fresh: List[RawEvent] = []
+        batch: set[str] = set()
+        with self._lock:
+            for event in events:
+                if event.hash in batch:
+                    continue
+                if event.hash in self._hashes:
+                    self._hashes.move_to_end(event.hash)
+                    continue
+                batch.add(event.hash)
+                fresh.append(event)
+        return fresh
+
+    def warm(self, conn, since: datetime) -> None:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT hash FROM raw_events
+                WHERE created_at >= %s
+                ORDER BY created_at DESC
+                LIMIT %s
+                """,
+                (since, self.max_size),
+            )
+            rows = cur.fetchall()
+        self.add_many(row[0] for row in reversed(rows))
+        self.warmed = True
+
+
+_seen: Optional[SeenHashes] = None
+_seen_lock = threading.Lock()
+
+
+def get_seen_hashes(conn, settings: Settings) -> SeenHashes:
+    global _seen
+    with _seen_lock:
+        if _seen is None:
+            _seen = SeenHashes(settings.dedupe_cache_size)
+        if not _seen.warmed and settings.dedupe_warm_hours > 0:
+            _seen.warm(conn, datetime.utcnow() - timedelta(hours=settings.dedupe_warm_hours))
+        return _seen
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+from .config import Settings
+from .db import EventWithSentiment
+from .models import RawEvent
+
+
+Enrichment = Tuple[Optional[str], float, bool]
+
+
+def _warm_worker() -> None:
+    from .language import detect_language
+    from .sentiment import score_sentiment
+
+    detect_language("warm up the language profiles")
+    score_sentiment("warm up the sentiment lexicon")
+
+
+def _enrich_texts(texts: Sequence[str]) -> List[Enrichment]:
+    from .language import detect_language
+    from .sentiment import score_sentiment
+
+    results = []
+    for text in texts:
+        sentiment_score, is_negative = score_sentiment(text)
+        results.append((detect_language(text), sentiment_score, is_negative))
+    return results
+
+
+class EnrichmentPool:
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.settings.enrich_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_worker,
+                )
+            return self._executor
+
+    def enrich(self, events: List[RawEvent]) -> List[EventWithSentiment]:
+        if not events:
+            return []
+        texts = [event.text for event in events]
+        batch_size = max(1, self.settings.enrich_batch_size)
+        if self.settings.enrich_workers <= 1 or len(texts) <= batch_size:
+            results = _enrich_texts(texts)
+        else:
+            chunks = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+            results = []
+            for chunk_results in self._get_executor().map(_enrich_texts, chunks):
+                results.extend(chunk_results)
+
+        enriched: List[EventWithSentiment] = []
+        for event, (language, sentiment_score, is_negative) in zip(events, results):
+            event.language = language
+            enriched.append((event, sentiment_score, is_negative))
+        return enriched
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pool: Optional[EnrichmentPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_enrichment_pool(settings: Settings) -> EnrichmentPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = EnrichmentPool(settings)
+        return _pool
+
+
+def close_enrichment_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool:
+        pool.close()
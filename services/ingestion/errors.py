@@ -1,2 +1,6 @@
 class SkipSource(Exception):
     """Raised when a source is intentionally skipped (no credentials or blocked)."""
+
+
+class CircuitOpen(Exception):
+    """Raised when a source or host circuit breaker is rejecting calls."""
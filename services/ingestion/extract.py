@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Iterator, Sequence
+
+from lxml import etree, html as lxml_html
+
+
+BLOCK_TAGS = frozenset({"p", "div", "li"})
+SKIP_TAGS = frozenset({"script", "style", "noscript", "template"})
+
+_XML_DECLARATION = re.compile(r"^\s*<\?xml[^>]*\?>")
+_PARSER = lxml_html.HTMLParser(remove_comments=True, remove_pis=True, huge_tree=True)
+
+
+@lru_cache(maxsize=32)
+def keyword_pattern(keywords: tuple[str, ...]) -> re.Pattern[str]:
+    ordered = sorted({keyword.lower() for keyword in keywords if keyword}, key=len, reverse=True)
+    return re.compile("|".join(re.escape(keyword) for keyword in ordered), re.IGNORECASE)
+
+
+def _flush(buffer: list[str]) -> str:
+    text = " ".join(" ".join(buffer).split())
+    buffer.clear()
+    return text
+
+
+def iter_text_blocks(html: str) -> Iterator[str]:
+    """Yield each run of text inside a p/div/li, split where a nested block starts or ends.
+
+    Inline tags such as span or a stay part of the enclosing block's text, and
+    the document is walked once instead of re-joining each subtree.
+    """
+    try:
+        # lxml refuses str input that carries an encoding declaration.
+        root = lxml_html.document_fromstring(
+            _XML_DECLARATION.sub("", html, count=1), parser=_PARSER
+        )
+    except (etree.ParserError, ValueError):
+        return
+    buffers: list[list[str]] = [[]]
+    skipping = 0
+    for action, element in etree.iterwalk(root, events=("start", "end")):
+        tag = element.tag if isinstance(element.tag, str) else None
+        if action == "start":
+            if tag in SKIP_TAGS:
+                skipping += 1
+            if skipping:
+                continue
+            if tag in BLOCK_TAGS:
+                text = _flush(buffers[-1])
+                if text and len(buffers) > 1:
+                    yield text
+                buffers.append([])
+            if tag and element.text:
+                buffers[-1].append(element.text)
+            continue
+        if tag in SKIP_TAGS:
+            skipping -= 1
+        elif not skipping and tag in BLOCK_TAGS:
+            text = _flush(buffers.pop())
+            if text:
+                yield text
+        if not skipping and element.tail:
+            buffers[-1].append(element.tail)
+
+
+def extract_snippets(
+    html: str, keywords: Sequence[str], limit: int = 5, min_length: int = 40
+) -> list[str]:
+    if limit <= 0 or not keywords:
+        return []
+    pattern = keyword_pattern(tuple(keywords))
+    texts: list[str] = []
+    for text in iter_text_blocks(html):
+        if len(text) < min_length or not pattern.search(text):
+            continue
+        texts.append(text)
+        if len(texts) >= limit:
+            break
+    return texts
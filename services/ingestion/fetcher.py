@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import re
+import threading
+from typing import Iterable, Optional, Set
+from urllib.parse import urlparse
+
+import requests
+
+from .browser import get_browser_pool
+from .circuit import HostBreakers
+from .config import Settings
+from .errors import CircuitOpen
+from .health import load_host_circuits, save_host_circuits
+from .httpcache import HttpResult, get_http_cache
+from .ratelimit import get_host_limiter
+from .sessions import get_session
+
+
+_SCRIPT_RE = re.compile(r"<(script|style|noscript)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]+>")
+_JS_MARKERS = (
+    "enable javascript",
+    "javascript is required",
+    "javascript is disabled",
+    "turn on javascript",
+)
+
+
+def needs_javascript(html: str, min_text_chars: int) -> bool:
+    lowered = html.lower()
+    if any(marker in lowered for marker in _JS_MARKERS):
+        return True
+    visible = _TAG_RE.sub(" ", _SCRIPT_RE.sub(" ", html))
+    return len(" ".join(visible.split())) < min_text_chars
+
+
+class TieredFetcher:
+    """Plain HTTP first, headless Chromium only for pages that need it.
+
+    ``render_js`` pins a source to one tier; ``None`` lets the fetcher decide
+    from the HTTP response and remember hosts that needed the browser.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self._js_hosts: Set[str] = set()
+        self._lock = threading.Lock()
+        self._breakers = HostBreakers(settings)
+
+    def load_hosts(self, conn, urls: Iterable[str]) -> None:
+        load_host_circuits(conn, self._breakers, (urlparse(url).netloc.lower() for url in urls))
+
+    def save_hosts(self, conn) -> None:
+        save_host_circuits(conn, self._breakers)
+
+    def _remember_js_host(self, host: str) -> None:
+        with self._lock:
+            self._js_hosts.add(host)
+
+    def _fetch_http(self, url: str) -> Optional[HttpResult]:
+        get_host_limiter(self.settings).acquire(url)
+        result = get_http_cache(self.settings).get(
+            get_session(self.settings), url, self.settings.request_timeout
+        )
+        if result.status_code >= 500 or result.status_code == 429:
+            raise requests.HTTPError(f"{result.status_code} from {url}")
+        if result.status_code >= 400:
+            return None
+        if "html" not in result.content_type and "xml" not in result.content_type:
+            return None
+        return result
+
+    def fetch_html(
+        self,
+        url: str,
+        render_js: Optional[bool] = None,
+        ready_selector: Optional[str] = None,
+    ) -> Optional[str]:
+        host = urlparse(url).netloc.lower()
+        breaker = self._breakers.get(host)
+        ticket = breaker.allow()
+        if ticket is None:
+            raise CircuitOpen(f"Circuit open for {host}")
+        try:
+            html = self._fetch_tiered(url, host, render_js, ready_selector)
+        except Exception:
+            breaker.record_failure(ticket)
+            raise
+        breaker.record_success(ticket)
+        return html
+
+    def _fetch_tiered(
+        self,
+        url: str,
+        host: str,
+        render_js: Optional[bool],
+        ready_selector: Optional[str],
+    ) -> Optional[str]:
+        use_browser = render_js is True or (render_js is None and host in self._js_hosts)
+        escalated = False
+        if not use_browser:
+            result = self._fetch_http(url)
+            # 4xx and non-HTML responses are final; only a readable page that
+            # turns out to need scripts is worth a browser page.
+            if result is None:
+                return None
+            html = result.text
+            if not needs_javascript(html, self.settings.min_static_text_chars):
+                # An unchanged static page has nothing new to extract.
+                return None if result.not_modified else html
+            if render_js is False:
+                return html
+            self._remember_js_host(host)
+            escalated = True
+        # An escalated URL already paid its rate-limit token in the HTTP tier.
+        return get_browser_pool(self.settings).fetch_html(
+            url, ready_selector, acquire=not escalated
+        )
+
+
+_fetcher: Optional[TieredFetcher] = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher(settings: Settings) -> TieredFetcher:
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = TieredFetcher(settings)
+        return _fetcher
@@ -1,30 +1,142 @@
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Tuple
 
+from psycopg2.extras import execute_values
 
-def update_source_health(conn, source: str, had_error: bool) -> int:
+from .circuit import CircuitBreaker, HostBreakers, build_breaker
+from .config import Settings
+
+
+def update_source_health(conn, source: str, had_error: bool, tick_at: datetime) -> int:
+    """Record one task's outcome and return the source's failed-tick streak.
+
+    A scheduler tick can fan a source out into several shard tasks, so
+    failures are counted once per tick: any failed shard marks the tick as
+    failed, and the streak only resets when a newer tick starts after a tick
+    in which every shard succeeded.
+    """
     now = datetime.utcnow()
     with conn.cursor() as cur:
         cur.execute(
             """
-            INSERT INTO source_health (source, consecutive_failures, last_success, last_failure)
-            VALUES (%s, %s, %s, %s)
+            INSERT INTO source_health
+              (source, consecutive_failures, last_success, last_failure, tick_at, tick_failed)
+            VALUES (%(source)s, %(failures)s, %(success)s, %(failure)s, %(tick_at)s, %(had_error)s)
             ON CONFLICT (source) DO UPDATE SET
-              consecutive_failures = CASE WHEN %s THEN source_health.consecutive_failures + 1 ELSE 0 END,
-              last_success = CASE WHEN %s THEN source_health.last_success ELSE EXCLUDED.last_success END,
-              last_failure = CASE WHEN %s THEN EXCLUDED.last_failure ELSE source_health.last_failure END
+              consecutive_failures = CASE
+                WHEN source_health.tick_at IS NULL OR EXCLUDED.tick_at > source_health.tick_at
+                  THEN CASE WHEN source_health.tick_failed
+                         THEN source_health.consecutive_failures ELSE 0 END
+                       + EXCLUDED.consecutive_failures
+                WHEN EXCLUDED.tick_at = source_health.tick_at
+                     AND EXCLUDED.tick_failed AND NOT source_health.tick_failed
+                  THEN source_health.consecutive_failures + 1
+                ELSE source_health.consecutive_failures
+              END,
+              tick_failed = CASE
+                WHEN source_health.tick_at IS NULL OR EXCLUDED.tick_at > source_health.tick_at
+                  THEN EXCLUDED.tick_failed
+                WHEN EXCLUDED.tick_at = source_health.tick_at
+                  THEN source_health.tick_failed OR EXCLUDED.tick_failed
+                ELSE source_health.tick_failed
+              END,
+              tick_at = GREATEST(source_health.tick_at, EXCLUDED.tick_at),
+              last_success = COALESCE(EXCLUDED.last_success, source_health.last_success),
+              last_failure = COALESCE(EXCLUDED.last_failure, source_health.last_failure)
             RETURNING consecutive_failures
             """,
-            (
-                source,
-                1 if had_error else 0,
-                None if had_error else now,
-                now if had_error else None,
-                had_error,
-                had_error,
-                had_error,
-            ),
+            {
+                "source": source,
+                "failures": 1 if had_error else 0,
+                "success": None if had_error else now,
+                "failure": now if had_error else None,
+                "tick_at": tick_at,
+                "had_error": had_error,
+            },
         )
         row = cur.fetchone()
     return row[0] if row else 0
+
+
+HOST_KEY_PREFIX = "host:"
+
+
+def _load_circuit_rows(conn, keys: List[str]) -> Dict[str, tuple]:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT source, circuit_state, EXTRACT(EPOCH FROM opened_until), circuit_trips
+            FROM source_health
+            WHERE source = ANY(%s)
+            """,
+            (keys,),
+        )
+        rows = cur.fetchall()
+    return {
+        key: (state, float(opened_until) if opened_until is not None else None, trips)
+        for key, state, opened_until, trips in rows
+    }
+
+
+def load_source_circuit(conn, source: str, settings: Settings) -> CircuitBreaker:
+    row = _load_circuit_rows(conn, [source]).get(source)
+    if not row:
+        return build_breaker(settings)
+    state, opened_until, trips = row
+    return build_breaker(settings, state=state, opened_until=opened_until, trips=trips)
+
+
+def save_source_circuit(conn, source: str, breaker: CircuitBreaker) -> None:
+    _save_circuits(conn, [(source, breaker)])
+
+
+def load_host_circuits(conn, breakers: HostBreakers, hosts: Iterable[str]) -> None:
+    """Bring the process's host breakers up to date with what other workers stored."""
+    hosts = sorted(set(hosts))
+    if not hosts:
+        return
+    rows = _load_circuit_rows(conn, [HOST_KEY_PREFIX + host for host in hosts])
+    for host in hosts:
+        row = rows.get(HOST_KEY_PREFIX + host)
+        if row:
+            breakers.get(host).adopt(*row)
+
+
+def save_host_circuits(conn, breakers: HostBreakers) -> None:
+    _save_circuits(
+        conn, [(HOST_KEY_PREFIX + host, breaker) for host, breaker in breakers.changed()]
+    )
+
+
+def _save_circuits(conn, circuits: List[Tuple[str, CircuitBreaker]]) -> None:
+    if not circuits:
+        return
+    rows = [
+        (
+            key,
+            breaker.state,
+            datetime.fromtimestamp(breaker.opened_until, tz=timezone.utc)
+            if breaker.opened_until
+            else None,
+            breaker.trips,
+        )
+        for key, breaker in circuits
+    ]
+    with conn.cursor() as cur:
+        execute_values(
+            cur,
+            """
+            INSERT INTO source_health (source, circuit_state, opened_until, circuit_trips)
+            VALUES %s
+            ON CONFLICT (source) DO UPDATE SET
+              circuit_state = EXCLUDED.circuit_state,
+              opened_until = EXCLUDED.opened_until,
+              circuit_trips = EXCLUDED.circuit_trips
+            """,
+            rows,
+            page_size=len(rows),
+        )
+    for _, breaker in circuits:
+        breaker.changed = False
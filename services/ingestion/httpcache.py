@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import requests
+
+from .config import Settings
+
+
+@dataclass
+class HttpResult:
+    status_code: int
+    content_type: str
+    encoding: Optional[str]
+    not_modified: bool
+    body_path: Optional[str] = None
+    body: Optional[bytes] = None
+
+    @property
+    def content(self) -> bytes:
+        if self.body is None and self.body_path:
+            try:
+                with open(self.body_path, "rb") as handle:
+                    self.body = handle.read()
+            except FileNotFoundError:
+                self.body = b""
+        return self.body or b""
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+
+class HttpCache:
+    """Conditional-GET cache shared by every process on the node.
+
+    Bodies live under objects/ named by their SHA-256, and a SQLite index maps
+    each URL to its body and validators. A 304 comes back with
+    ``not_modified=True`` so callers can skip parsing a body they already
+    handled; the cached body is still readable for callers that need it.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._objects = os.path.join(directory, "objects")
+        os.makedirs(self._objects, exist_ok=True)
+        self._conn = sqlite3.connect(
+            os.path.join(directory, "index.sqlite3"),
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                  url TEXT PRIMARY KEY,
+                  digest TEXT NOT NULL,
+                  size INTEGER NOT NULL,
+                  etag TEXT,
+                  last_modified TEXT,
+                  content_type TEXT,
+                  encoding TEXT,
+                  accessed_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_accessed_idx ON entries (accessed_at);
+                CREATE INDEX IF NOT EXISTS entries_digest_idx ON entries (digest);
+                """
+            )
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self._objects, digest[:2], digest)
+
+    def _lookup(self, url: str) -> Optional[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                """
+                SELECT digest, etag, last_modified, content_type, encoding
+                FROM entries WHERE url = ?
+                """,
+                (url,),
+            ).fetchone()
+
+    def _touch(self, url: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE url = ?", (time.time(), url)
+            )
+
+    def _write_object(self, digest: str, body: bytes) -> str:
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(body)
+        os.replace(tmp_path, path)
+        return path
+
+    def _store(self, url: str, response: requests.Response) -> str:
+        body = response.content
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._write_object(digest, body)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                previous = self._conn.execute(
+                    "SELECT digest FROM entries WHERE url = ?", (url,)
+                ).fetchone()
+                self._conn.execute(
+                    """
+                    INSERT INTO entries
+                      (url, digest, size, etag, last_modified, content_type, encoding, accessed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (url) DO UPDATE SET
+                      digest = excluded.digest,
+                      size = excluded.size,
+                      etag = excluded.etag,
+                      last_modified = excluded.last_modified,
+                      content_type = excluded.content_type,
+                      encoding = excluded.encoding,
+                      accessed_at = excluded.accessed_at
+                    """,
+                    (
+                        url,
+                        digest,
+                        len(body),
+                        response.headers.get("ETag"),
+                        response.headers.get("Last-Modified"),
+                        response.headers.get("Content-Type", ""),
+                        response.encoding,
+                        time.time(),
+                    ),
+                )
+                orphans = self._evict()
+                if previous and previous[0] != digest and not self._referenced(previous[0]):
+                    orphans.append(previous[0])
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        for orphan in orphans:
+            try:
+                os.remove(self._object_path(orphan))
+            except FileNotFoundError:
+                pass
+        return path
+
+    def _referenced(self, digest: str) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)
+        ).fetchone()
+        return row is not None
+
+    def _evict(self) -> list[str]:
+        total = self._conn.execute(
+            """
+            SELECT COALESCE(SUM(size), 0)
+            FROM (SELECT MAX(size) AS size FROM entries GROUP BY digest)
+            """
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return []
+        orphans = []
+        for url, digest, size in self._conn.execute(
+            "SELECT url, digest, size FROM entries ORDER BY accessed_at"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE url = ?", (url,))
+            if not self._referenced(digest):
+                orphans.append(digest)
+                total -= size
+        return orphans
+
+    def get(
+        self, session: requests.Session, url: str, timeout: float, **kwargs
+    ) -> HttpResult:
+        cached = self._lookup(url)
+        headers = dict(kwargs.pop("headers", None) or {})
+        if cached:
+            digest, etag, last_modified, _, _ = cached
+            if not os.path.exists(self._object_path(digest)):
+                cached = None
+            else:
+                if etag:
+                    headers["If-None-Match"] = etag
+                if last_modified:
+                    headers["If-Modified-Since"] = last_modified
+        response = session.get(url, headers=headers, timeout=timeout, **kwargs)
+        if response.status_code == 304 and cached:
+            digest, _, _, content_type, encoding = cached
+            self._touch(url)
+            return HttpResult(
+                status_code=200,
+                content_type=content_type or "",
+                encoding=encoding,
+                not_modified=True,
+                body_path=self._object_path(digest),
+            )
+        result = HttpResult(
+            status_code=response.status_code,
+            content_type=response.headers.get("Content-Type", ""),
+            encoding=response.encoding,
+            not_modified=False,
+            body=response.content,
+        )
+        if response.status_code == 200 and (
+            response.headers.get("ETag") or response.headers.get("Last-Modified")
+        ):
+            self._store(url, response)
+        return result
+
+
+class PassthroughCache:
+    def get(
+        self, session: requests.Session, url: str, timeout: float, **kwargs
+    ) -> HttpResult:
+        response = session.get(url, timeout=timeout, **kwargs)
+        return HttpResult(
+            status_code=response.status_code,
+            content_type=response.headers.get("Content-Type", ""),
+            encoding=response.encoding,
+            not_modified=False,
+            body=response.content,
+        )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_http_cache(settings: Settings):
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            if settings.http_cache_dir and settings.http_cache_max_mb > 0:
+                _cache = HttpCache(
+                    settings.http_cache_dir, settings.http_cache_max_mb * 1024 * 1024
+                )
+            else:
+                _cache = PassthroughCache()
+        return _cache
@@ -2,7 +2,10 @@ from __future__ import annotations
 
 from datetime import datetime, timedelta
 
+from .browser import close_browser_pool
 from .config import get_settings
+from .db import close_pool
+from .enrich import close_enrichment_pool
 from .models import Task
 from .sources import ADAPTERS
 from .worker import handle_task, build_logger
@@ -12,8 +15,13 @@ def main():
     settings = get_settings()
     logger = build_logger(settings.log_level)
     since_ts = datetime.utcnow() - timedelta(minutes=15)
-    for source in settings.source_allowlist or list(ADAPTERS.keys()):
-        handle_task(Task(source=source, since_ts=since_ts), logger)
+    try:
+        for source in settings.source_allowlist or list(ADAPTERS.keys()):
+            handle_task(Task(source=source, since_ts=since_ts), logger)
+    finally:
+        close_browser_pool()
+        close_enrichment_pool()
+        close_pool()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import re
+from typing import Callable, List
+
+from .models import Company
+
+
+def company_terms(company: Company) -> list[str]:
+    terms = []
+    for term in [company.name] + company.aliases:
+        term = term.strip()
+        if term and term not in terms:
+            terms.append(term)
+    return terms
+
+
+class CompanyMatcher:
+    def __init__(self, companies: List[Company]):
+        self.companies = companies
+        self._patterns = [
+            (
+                company,
+                re.compile(
+                    "|".join(
+                        rf"(?<!\w){re.escape(term)}(?!\w)"
+                        for term in sorted(company_terms(company), key=len, reverse=True)
+                    ),
+                    re.IGNORECASE,
+                ),
+            )
+            for company in companies
+            if company_terms(company)
+        ]
+
+    def match(self, text: str) -> list[Company]:
+        """Companies mentioned in text.
+
+        A company whose every mention sits inside a longer mention of another
+        company ("Ola" inside "Ola Electric") is dropped, since the event hash
+        does not include the company and only one of them would be kept.
+        """
+        spans = {
+            company.id: [match.span() for match in pattern.finditer(text)]
+            for company, pattern in self._patterns
+        }
+        mentions = [
+            (start, end, company_id)
+            for company_id, found in spans.items()
+            for start, end in found
+        ]
+        matched = [
+            company
+            for company, _ in self._patterns
+            if any(
+                not any(
+                    other != company.id
+                    and other_start <= start
+                    and end <= other_end
+                    and other_end - other_start > end - start
+                    for other_start, other_end, other in mentions
+                )
+                for start, end in spans[company.id]
+            )
+        ]
+        if not matched and len(self.companies) == 1:
+            return list(self.companies)
+        return matched
+
+
+def pack_batches(
+    companies: List[Company],
+    build_query: Callable[[List[Company]], str],
+    max_length: int,
+    max_companies: int,
+) -> list[list[Company]]:
+    batches: list[list[Company]] = []
+    current: list[Company] = []
+    for company in companies:
+        candidate = current + [company]
+        if current and (
+            len(candidate) > max_companies or len(build_query(candidate)) > max_length
+        ):
+            batches.append(current)
+            candidate = [company]
+        current = candidate
+    if current:
+        batches.append(current)
+    return batches
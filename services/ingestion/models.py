@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -28,3 +28,7 @@ class Company(BaseModel):
 class Task(BaseModel):
     source: str
     since_ts: Optional[datetime] = None
+    company_ids: Optional[List[int]] = None
+    min_company_id: Optional[int] = None
+    max_company_id: Optional[int] = None
+    scheduled_at: Optional[datetime] = None
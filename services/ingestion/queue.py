@@ -1,14 +1,28 @@
 from __future__ import annotations
 
 import json
-from typing import Iterable, List
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Deque, Iterable, List, Optional, Tuple
 
 import boto3
 
-from .config import get_settings
+from .config import Settings, get_settings
 from .models import Task
 
 
+SQS_BATCH_LIMIT = 10
+
+
+def _chunks(items: List[dict], size: int = SQS_BATCH_LIMIT) -> Iterable[List[dict]]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
 class SqsQueue:
     def __init__(self):
         settings = get_settings()
@@ -16,6 +30,38 @@ class SqsQueue:
             raise RuntimeError("SQS_QUEUE_URL is required")
         self.queue_url = settings.sqs_queue_url
         self.client = boto3.client("sqs", region_name=settings.aws_region)
+        # Holding more than the worker can start leaves messages invisible to
+        # other workers while they wait in the buffer.
+        self.prefetch = min(settings.queue_prefetch, max(1, settings.worker_concurrency))
+        self.wait_seconds = settings.queue_wait_seconds
+        self.visibility_timeout = settings.visibility_timeout
+        self.batch_retries = settings.queue_batch_retries
+        self._buffer: Deque[Tuple[float, dict]] = deque()
+        self._buffer_ready = threading.Condition()
+        self._prefetcher: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def _send_batches(self, entries: List[dict], call: Callable[[List[dict]], dict]) -> None:
+        for chunk in _chunks(entries):
+            pending = chunk
+            for attempt in range(self.batch_retries + 1):
+                response = call(pending)
+                failed_ids = {
+                    failure["Id"]
+                    for failure in response.get("Failed", [])
+                    if not failure.get("SenderFault")
+                }
+                sender_faults = [
+                    failure for failure in response.get("Failed", []) if failure.get("SenderFault")
+                ]
+                if sender_faults:
+                    raise RuntimeError(f"SQS rejected batch entries: {sender_faults}")
+                pending = [entry for entry in pending if entry["Id"] in failed_ids]
+                if not pending:
+                    break
+                time.sleep(min(2 ** attempt * 0.2, 5))
+            if pending:
+                raise RuntimeError(f"SQS batch entries failed after retries: {[e['Id'] for e in pending]}")
 
     def enqueue(self, task: Task) -> None:
         self.client.send_message(
@@ -33,19 +79,131 @@ class SqsQueue:
         ]
         if not entries:
             return
-        self.client.send_message_batch(QueueUrl=self.queue_url, Entries=entries)
+        self._send_batches(
+            entries,
+            lambda chunk: self.client.send_message_batch(QueueUrl=self.queue_url, Entries=chunk),
+        )
 
-    def poll(self, max_messages: int = 5) -> List[dict]:
+    def _receive(self, max_messages: int, wait_seconds: int) -> List[dict]:
         response = self.client.receive_message(
             QueueUrl=self.queue_url,
-            MaxNumberOfMessages=max_messages,
-            WaitTimeSeconds=10,
+            MaxNumberOfMessages=min(max_messages, SQS_BATCH_LIMIT),
+            WaitTimeSeconds=wait_seconds,
+            VisibilityTimeout=self.visibility_timeout,
         )
         return response.get("Messages", [])
 
+    def _prefetch_loop(self) -> None:
+        while not self._stopped.is_set():
+            with self._buffer_ready:
+                while len(self._buffer) >= self.prefetch and not self._stopped.is_set():
+                    self._buffer_ready.wait(timeout=1)
+                room = self.prefetch - len(self._buffer)
+            if self._stopped.is_set():
+                return
+            try:
+                messages = self._receive(room, self.wait_seconds)
+            except Exception:
+                time.sleep(1)
+                continue
+            received_at = time.monotonic()
+            with self._buffer_ready:
+                stopped = self._stopped.is_set()
+                if not stopped:
+                    self._buffer.extend((received_at, message) for message in messages)
+                    self._buffer_ready.notify_all()
+            if stopped:
+                self._release(messages)
+                return
+
+    def _ensure_prefetcher(self) -> None:
+        if self._prefetcher is None:
+            self._prefetcher = threading.Thread(
+                target=self._prefetch_loop, name="sqs-prefetch", daemon=True
+            )
+            self._prefetcher.start()
+
+    def poll(self, max_messages: int = SQS_BATCH_LIMIT) -> List[dict]:
+        if self.prefetch <= 0:
+            return self._receive(max_messages, self.wait_seconds)
+        self._ensure_prefetcher()
+        # Messages held longer than half their visibility timeout are released
+        # for redelivery rather than handed to a task.
+        stale_after = self.visibility_timeout / 2
+        messages: List[dict] = []
+        stale: List[dict] = []
+        with self._buffer_ready:
+            if not self._buffer:
+                self._buffer_ready.wait(timeout=self.wait_seconds)
+            now = time.monotonic()
+            while self._buffer and len(messages) < max_messages:
+                received_at, message = self._buffer.popleft()
+                if now - received_at < stale_after:
+                    messages.append(message)
+                else:
+                    stale.append(message)
+            self._buffer_ready.notify_all()
+        self._release(stale)
+        return messages
+
+    def _release(self, messages: List[dict]) -> None:
+        """Make unconsumed messages visible to other workers right away."""
+        try:
+            self.change_visibility_many(
+                (message["ReceiptHandle"] for message in messages), 0
+            )
+        except Exception:
+            # They become visible again when their visibility timeout expires.
+            pass
+
     def delete(self, receipt_handle: str) -> None:
         self.client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=receipt_handle)
 
+    def delete_many(self, receipt_handles: Iterable[str]) -> None:
+        entries = [
+            {"Id": str(idx), "ReceiptHandle": handle}
+            for idx, handle in enumerate(receipt_handles)
+        ]
+        if not entries:
+            return
+        self._send_batches(
+            entries,
+            lambda chunk: self.client.delete_message_batch(QueueUrl=self.queue_url, Entries=chunk),
+        )
+
+    def change_visibility(self, receipt_handle: str, timeout_seconds: int) -> None:
+        self.client.change_message_visibility(
+            QueueUrl=self.queue_url,
+            ReceiptHandle=receipt_handle,
+            VisibilityTimeout=timeout_seconds,
+        )
+
+    def change_visibility_many(self, receipt_handles: Iterable[str], timeout_seconds: int) -> None:
+        entries = [
+            {"Id": str(idx), "ReceiptHandle": handle, "VisibilityTimeout": timeout_seconds}
+            for idx, handle in enumerate(receipt_handles)
+        ]
+        if not entries:
+            return
+        self._send_batches(
+            entries,
+            lambda chunk: self.client.change_message_visibility_batch(
+                QueueUrl=self.queue_url, Entries=chunk
+            ),
+        )
+
+    def close(self) -> None:
+        self._stopped.set()
+        with self._buffer_ready:
+            self._buffer_ready.notify_all()
+        if self._prefetcher:
+            self._prefetcher.join(timeout=self.wait_seconds + 1)
+            self._prefetcher = None
+        with self._buffer_ready:
+            unconsumed = [message for _, message in self._buffer]
+            self._buffer.clear()
+        self._release(unconsumed)
+
 
 class LocalQueue:
     def __init__(self):
@@ -58,7 +216,7 @@ class LocalQueue:
         for task in tasks:
             self.enqueue(task)
 
-    def poll(self, max_messages: int = 5) -> List[dict]:
+    def poll(self, max_messages: int = SQS_BATCH_LIMIT) -> List[dict]:
         items = self._items[:max_messages]
         self._items = self._items[max_messages:]
         return [
@@ -72,6 +230,151 @@ class LocalQueue:
     def delete(self, receipt_handle: str) -> None:
         return
 
+    def delete_many(self, receipt_handles: Iterable[str]) -> None:
+        return
+
+    def change_visibility(self, receipt_handle: str, timeout_seconds: int) -> None:
+        return
+
+    def change_visibility_many(self, receipt_handles: Iterable[str], timeout_seconds: int) -> None:
+        return
+
+    def close(self) -> None:
+        return
+
+
+class SqliteQueue:
+    """Durable queue in a SQLite file that several worker processes can share.
+
+    A claim moves a message's visible_at past the visibility timeout and gives
+    it a fresh receipt inside one write transaction, so only one consumer gets
+    it. Messages that are not deleted before visible_at become claimable again.
+    """
+
+    def __init__(self, path: str, visibility_timeout: int, wait_seconds: int = 0):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.wait_seconds = wait_seconds
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS messages (
+                  id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  body TEXT NOT NULL,
+                  visible_at REAL NOT NULL,
+                  receipt TEXT,
+                  receive_count INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS messages_visible_idx ON messages (visible_at, id);
+                CREATE UNIQUE INDEX IF NOT EXISTS messages_receipt_idx ON messages (receipt);
+                """
+            )
+
+    def _write(self, statement: str, rows: List[tuple]) -> None:
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(statement, rows)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def enqueue(self, task: Task) -> None:
+        self.enqueue_many([task])
+
+    def enqueue_many(self, tasks: Iterable[Task]) -> None:
+        now = time.time()
+        self._write(
+            "INSERT INTO messages (body, visible_at) VALUES (?, ?)",
+            [(task.model_dump_json(), now) for task in tasks],
+        )
+
+    def _claim(self, max_messages: int) -> List[dict]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    """
+                    SELECT id, body FROM messages
+                    WHERE visible_at <= ?
+                    ORDER BY visible_at, id
+                    LIMIT ?
+                    """,
+                    (now, max_messages),
+                ).fetchall()
+                claimed = [(uuid.uuid4().hex, message_id, body) for message_id, body in rows]
+                self._conn.executemany(
+                    """
+                    UPDATE messages
+                    SET receipt = ?, visible_at = ?, receive_count = receive_count + 1
+                    WHERE id = ?
+                    """,
+                    [
+                        (receipt, now + self.visibility_timeout, message_id)
+                        for receipt, message_id, _ in claimed
+                    ],
+                )
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return [{"Body": body, "ReceiptHandle": receipt} for receipt, _, body in claimed]
+
+    def poll(self, max_messages: int = SQS_BATCH_LIMIT) -> List[dict]:
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            messages = self._claim(max_messages)
+            if messages or time.monotonic() >= deadline:
+                return messages
+            time.sleep(min(0.5, max(0.0, deadline - time.monotonic())))
+
+    def delete(self, receipt_handle: str) -> None:
+        self.delete_many([receipt_handle])
+
+    def delete_many(self, receipt_handles: Iterable[str]) -> None:
+        self._write(
+            "DELETE FROM messages WHERE receipt = ?",
+            [(handle,) for handle in receipt_handles],
+        )
+
+    def change_visibility(self, receipt_handle: str, timeout_seconds: int) -> None:
+        self.change_visibility_many([receipt_handle], timeout_seconds)
+
+    def change_visibility_many(self, receipt_handles: Iterable[str], timeout_seconds: int) -> None:
+        visible_at = time.time() + timeout_seconds
+        self._write(
+            "UPDATE messages SET visible_at = ? WHERE receipt = ?",
+            [(visible_at, handle) for handle in receipt_handles],
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def build_queue(settings: Settings, local: bool = False):
+    if local or not settings.sqs_queue_url:
+        if settings.local_queue_path:
+            return SqliteQueue(
+                settings.local_queue_path,
+                settings.visibility_timeout,
+                min(settings.queue_wait_seconds, settings.idle_sleep_seconds),
+            )
+        return LocalQueue()
+    return SqsQueue()
+
 
 def parse_task(message: dict) -> Task:
     body = message.get("Body", "{}")
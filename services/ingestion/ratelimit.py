@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from .config import Settings
+
+
+@dataclass
+class TokenBucket:
+    rate: float
+    capacity: float
+    tokens: float = 0.0
+    updated_at: float = field(default_factory=time.monotonic)
+
+    def reserve(self, now: float) -> float:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        self.tokens -= 1.0
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class HostRateLimiter:
+    def __init__(self, interval_seconds: float, burst: int = 1):
+        self.interval_seconds = interval_seconds
+        self.burst = max(1, burst)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url: str) -> float:
+        if self.interval_seconds <= 0:
+            return 0.0
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(
+                    rate=1.0 / self.interval_seconds,
+                    capacity=float(self.burst),
+                    tokens=float(self.burst),
+                )
+                self._buckets[host] = bucket
+            wait = bucket.reserve(time.monotonic())
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+_limiter: Optional[HostRateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_host_limiter(settings: Settings) -> HostRateLimiter:
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = HostRateLimiter(settings.rate_limit_seconds, settings.host_rate_burst)
+        return _limiter
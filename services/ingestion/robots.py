@@ -1,46 +1,179 @@
 from __future__ import annotations
 
+import threading
 import time
 import urllib.robotparser
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Dict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
 from urllib.parse import urlparse
 
 import requests
+from psycopg2.extras import execute_values
+
+from .config import Settings
+from .httpcache import PassthroughCache, get_http_cache
+from .sessions import get_session
 
 
 @dataclass
 class RobotsCacheEntry:
     parser: urllib.robotparser.RobotFileParser
-    fetched_at: float
+    body: str
+    disallow_all: bool
+    expires_at: float
+
+
+def base_url_for(url: str) -> str:
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def _build_entry(body: str, disallow_all: bool, expires_at: float) -> RobotsCacheEntry:
+    parser = urllib.robotparser.RobotFileParser()
+    if disallow_all:
+        parser.disallow_all = True
+    else:
+        parser.parse(body.splitlines())
+    return RobotsCacheEntry(
+        parser=parser, body=body, disallow_all=disallow_all, expires_at=expires_at
+    )
 
 
 class RobotsChecker:
-    def __init__(self, user_agent: str, ttl_seconds: int = 3600):
+    """robots.txt rules shared by every task in the process.
+
+    Rules are kept in memory and, when a task calls ``prefetch`` with its
+    connection, loaded from and saved to the robots_cache table so other
+    workers reuse them. A 4xx robots.txt allows everything for the normal TTL.
+    An unreachable host or a 5xx disallows everything for the shorter
+    failure TTL.
+    """
+
+    def __init__(
+        self,
+        user_agent: str,
+        ttl_seconds: int = 3600,
+        session: Optional[requests.Session] = None,
+        cache=None,
+        failure_ttl_seconds: int = 600,
+        prefetch_workers: int = 8,
+    ):
         self.user_agent = user_agent
         self.ttl_seconds = ttl_seconds
+        self.failure_ttl_seconds = failure_ttl_seconds
+        self.prefetch_workers = max(1, prefetch_workers)
+        self.session = session or requests.Session()
+        self.cache = cache or PassthroughCache()
         self._cache: Dict[str, RobotsCacheEntry] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _host_lock(self, base_url: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(base_url, threading.Lock())
+
+    def _fresh(self, base_url: str) -> Optional[RobotsCacheEntry]:
+        entry = self._cache.get(base_url)
+        if entry and entry.expires_at > time.time():
+            return entry
+        return None
 
-    def _fetch_parser(self, base_url: str) -> urllib.robotparser.RobotFileParser:
-        robots_url = f"{base_url}/robots.txt"
-        parser = urllib.robotparser.RobotFileParser()
+    def _fetch_entry(
+        self, base_url: str, previous: Optional[RobotsCacheEntry] = None
+    ) -> RobotsCacheEntry:
+        now = time.time()
         try:
-            response = requests.get(robots_url, timeout=10)
-            if response.status_code >= 400:
-                parser.parse("")
-            else:
-                parser.parse(response.text.splitlines())
+            result = self.cache.get(self.session, f"{base_url}/robots.txt", timeout=10)
         except requests.RequestException:
-            parser.parse("")
-        return parser
+            return _build_entry("", True, now + self.failure_ttl_seconds)
+        if result.not_modified and previous is not None and not previous.disallow_all:
+            previous.expires_at = now + self.ttl_seconds
+            return previous
+        if result.status_code >= 500:
+            return _build_entry("", True, now + self.failure_ttl_seconds)
+        if result.status_code >= 400:
+            return _build_entry("", False, now + self.ttl_seconds)
+        return _build_entry(result.text, False, now + self.ttl_seconds)
+
+    def _refresh(self, base_url: str) -> RobotsCacheEntry:
+        with self._host_lock(base_url):
+            entry = self._fresh(base_url)
+            if entry is None:
+                entry = self._fetch_entry(base_url, self._cache.get(base_url))
+                self._cache[base_url] = entry
+            return entry
+
+    def prefetch(self, conn, urls: Iterable[str]) -> None:
+        hosts = {base_url_for(url) for url in urls}
+        missing = sorted(base_url for base_url in hosts if not self._fresh(base_url))
+        if not missing:
+            return
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT base_url, body, disallow_all, EXTRACT(EPOCH FROM expires_at)
+                FROM robots_cache
+                WHERE base_url = ANY(%s) AND expires_at > NOW()
+                """,
+                (missing,),
+            )
+            rows = cur.fetchall()
+        for base_url, body, disallow_all, expires_at in rows:
+            self._cache[base_url] = _build_entry(body or "", disallow_all, float(expires_at))
+
+        to_fetch = [base_url for base_url in missing if not self._fresh(base_url)]
+        if not to_fetch:
+            return
+        with ThreadPoolExecutor(
+            max_workers=min(self.prefetch_workers, len(to_fetch)), thread_name_prefix="robots"
+        ) as executor:
+            fetched: List[RobotsCacheEntry] = list(executor.map(self._refresh, to_fetch))
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                """
+                INSERT INTO robots_cache (base_url, body, disallow_all, expires_at)
+                VALUES %s
+                ON CONFLICT (base_url) DO UPDATE SET
+                  body = EXCLUDED.body,
+                  disallow_all = EXCLUDED.disallow_all,
+                  fetched_at = NOW(),
+                  expires_at = EXCLUDED.expires_at
+                """,
+                [
+                    (
+                        base_url,
+                        entry.body,
+                        entry.disallow_all,
+                        datetime.fromtimestamp(entry.expires_at, tz=timezone.utc),
+                    )
+                    for base_url, entry in zip(to_fetch, fetched)
+                ],
+                page_size=len(to_fetch),
+            )
 
     def allowed(self, url: str) -> bool:
-        parsed = urlparse(url)
-        base_url = f"{parsed.scheme}://{parsed.netloc}"
-        entry = self._cache.get(base_url)
-        now = time.time()
-        if not entry or now - entry.fetched_at > self.ttl_seconds:
-            parser = self._fetch_parser(base_url)
-            self._cache[base_url] = RobotsCacheEntry(parser=parser, fetched_at=now)
-            entry = self._cache[base_url]
+        base_url = base_url_for(url)
+        entry = self._fresh(base_url) or self._refresh(base_url)
         return entry.parser.can_fetch(self.user_agent, url)
+
+
+_checker: Optional[RobotsChecker] = None
+_checker_lock = threading.Lock()
+
+
+def get_robots_checker(settings: Settings) -> RobotsChecker:
+    global _checker
+    with _checker_lock:
+        if _checker is None:
+            _checker = RobotsChecker(
+                settings.user_agent,
+                ttl_seconds=settings.robots_ttl_seconds,
+                session=get_session(settings),
+                cache=get_http_cache(settings),
+                failure_ttl_seconds=settings.robots_failure_ttl_seconds,
+                prefetch_workers=settings.fetch_concurrency,
+            )
+        return _checker
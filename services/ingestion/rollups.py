@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Set
+
+
+STATE_NAME = "rollups"
+
+
+@dataclass
+class RollupState:
+    last_xmin: Optional[int]
+    last_run_at: Optional[datetime]
+
+
+def floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _as_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def load_rollup_state(conn) -> Optional[RollupState]:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT last_xmin, last_run_at
+            FROM aggregation_state
+            WHERE name = %s
+            FOR UPDATE
+            """,
+            (STATE_NAME,),
+        )
+        row = cur.fetchone()
+    if not row:
+        return None
+    return RollupState(last_xmin=row[0], last_run_at=_as_naive_utc(row[1]))
+
+
+def save_rollup_state(conn, last_xmin: int, last_run_at: datetime) -> None:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO aggregation_state (name, last_xmin, last_run_at)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (name) DO UPDATE SET
+              last_xmin = EXCLUDED.last_xmin,
+              last_run_at = EXCLUDED.last_run_at
+            """,
+            (STATE_NAME, last_xmin, last_run_at),
+        )
+
+
+def snapshot_xmin(conn) -> int:
+    """Oldest transaction id that may still be in progress for this snapshot."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        row = cur.fetchone()
+    return row[0]
+
+
+def companies_changed_since(conn, xmin: int) -> Set[int]:
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT DISTINCT company_id FROM event_rollups_hourly WHERE updated_xid >= %s",
+            (xmin,),
+        )
+        rows = cur.fetchall()
+    return {row[0] for row in rows}
+
+
+def refresh_rollups(conn, since: datetime) -> None:
+    start = floor_hour(since)
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM event_rollups_hourly WHERE bucket >= %s", (start,))
+        cur.execute(
+            """
+            INSERT INTO event_rollups_hourly
+              (bucket, company_id, source, total, one_star, negative)
+            SELECT
+                date_trunc('hour', re.created_at) AS bucket,
+                re.company_id,
+                re.source,
+                COUNT(*),
+                COUNT(*) FILTER (WHERE re.rating IS NOT NULL AND re.rating <= 1),
+                COUNT(*) FILTER (WHERE se.is_negative)
+            FROM raw_events re
+            LEFT JOIN sentiment_events se ON se.raw_event_id = re.id
+            WHERE re.created_at >= %s
+            GROUP BY 1, 2, 3
+            """,
+            (start,),
+        )
+
+
+def shifted_bucket_ranges(
+    windows: Dict[str, int], last_run_at: datetime, now: datetime
+) -> list[tuple[datetime, datetime]]:
+    """Buckets that a window boundary moved across between two runs.
+
+    Windows end at ``now``, so their boundaries move on every run and the
+    hour each boundary is currently in counts as shifted too.
+    """
+    old_bucket = floor_hour(last_run_at)
+    new_bucket = floor_hour(now) + timedelta(hours=1)
+    ranges = []
+    for hours in windows.values():
+        for offset in (0, hours, hours * 2):
+            ranges.append(
+                (old_bucket - timedelta(hours=offset), new_bucket - timedelta(hours=offset))
+            )
+    return ranges
+
+
+def companies_in_buckets(conn, ranges: Iterable[tuple[datetime, datetime]]) -> Set[int]:
+    ranges = list(ranges)
+    if not ranges:
+        return set()
+    conditions = " OR ".join(["(bucket >= %s AND bucket < %s)"] * len(ranges))
+    params = [value for bucket_range in ranges for value in bucket_range]
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT DISTINCT company_id FROM event_rollups_hourly WHERE {conditions}",
+            params,
+        )
+        rows = cur.fetchall()
+    return {row[0] for row in rows}
+
+
+def cleanup_old_rollups(conn, retention: timedelta) -> None:
+    with conn.cursor() as cur:
+        cur.execute(
+            "DELETE FROM event_rollups_hourly WHERE bucket < %s",
+            (datetime.utcnow() - retention,),
+        )
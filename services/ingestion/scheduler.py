@@ -2,33 +2,135 @@ from __future__ import annotations
 
 import argparse
 from datetime import datetime, timedelta
+from typing import Optional
 
+from .cadence import CrawlSlot, fetch_slots, mark_polled, select_due, update_activity
+from .companies import fetch_companies, shard_ranges
 from .config import get_settings
+from .db import close_pool, pooled_connection, transaction
 from .models import Task
-from .queue import LocalQueue, SqsQueue
+from .queue import build_queue
 from .sources import ADAPTERS
 
 
+def build_tasks(
+    sources: list[str],
+    since_ts: datetime,
+    ranges: list[tuple[Optional[int], Optional[int]]],
+    scheduled_at: Optional[datetime] = None,
+) -> list[Task]:
+    if not ranges:
+        return [
+            Task(source=source, since_ts=since_ts, scheduled_at=scheduled_at)
+            for source in sources
+        ]
+    return [
+        Task(
+            source=source,
+            since_ts=since_ts,
+            min_company_id=low,
+            max_company_id=high,
+            scheduled_at=scheduled_at,
+        )
+        for source in sources
+        for low, high in ranges
+    ]
+
+
+def build_adaptive_tasks(
+    slots: list[CrawlSlot],
+    default_since_ts: datetime,
+    shard_size: int,
+    scheduled_at: Optional[datetime] = None,
+) -> list[Task]:
+    by_source: dict[str, list[CrawlSlot]] = {}
+    for slot in slots:
+        by_source.setdefault(slot.source, []).append(slot)
+    tasks: list[Task] = []
+    for source, group in by_source.items():
+        group.sort(key=lambda slot: slot.company_id)
+        size = shard_size if shard_size > 0 else len(group)
+        for start in range(0, len(group), size):
+            chunk = group[start : start + size]
+            since_ts = min(slot.last_polled_at or default_since_ts for slot in chunk)
+            tasks.append(
+                Task(
+                    source=source,
+                    since_ts=since_ts,
+                    company_ids=[slot.company_id for slot in chunk],
+                    scheduled_at=scheduled_at,
+                )
+            )
+    return tasks
+
+
+def schedule_adaptive(queue, sources: list[str], since_ts: datetime, shard_size: int, settings):
+    now = datetime.utcnow()
+    try:
+        with pooled_connection() as conn, transaction(conn):
+            company_ids = [company.id for company in fetch_companies(conn)]
+            update_activity(conn, sources, company_ids, now, settings)
+            due = select_due(fetch_slots(conn, sources, company_ids), now, settings)
+            mark_polled(conn, due, now)
+            # Enqueue before committing so a failed send leaves the pairs due.
+            queue.enqueue_many(build_adaptive_tasks(due, since_ts, shard_size, scheduled_at=now))
+    finally:
+        close_pool()
+
+
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--local", action="store_true", help="Use local in-memory queue")
+    parser.add_argument(
+        "--local", action="store_true", help="Use the local SQLite queue (LOCAL_QUEUE_PATH)"
+    )
     parser.add_argument(
         "--since-minutes",
         type=int,
         default=5,
         help="Fetch data since N minutes ago",
     )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=None,
+        help="Split each source into tasks of N companies (0 disables sharding)",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Only enqueue companies that are due based on their recent activity",
+    )
     args = parser.parse_args()
 
     settings = get_settings()
-    queue = LocalQueue() if args.local or not settings.sqs_queue_url else SqsQueue()
-
-    since_ts = datetime.utcnow() - timedelta(minutes=args.since_minutes)
+    queue = build_queue(settings, local=args.local)
 
+    now = datetime.utcnow()
+    since_ts = now - timedelta(minutes=args.since_minutes)
+    shard_size = settings.shard_size if args.shard_size is None else args.shard_size
     allowlist = settings.source_allowlist or list(ADAPTERS.keys())
-    tasks = [Task(source=source, since_ts=since_ts) for source in allowlist]
 
-    queue.enqueue_many(tasks)
+    if args.adaptive:
+        try:
+            schedule_adaptive(queue, allowlist, since_ts, shard_size, settings)
+        finally:
+            queue.close()
+        return
+
+    ranges: list[tuple[Optional[int], Optional[int]]] = []
+    if shard_size > 0:
+        try:
+            with pooled_connection() as conn:
+                ranges = shard_ranges(fetch_companies(conn), shard_size)
+        finally:
+            close_pool()
+
+    tasks = build_tasks(allowlist, since_ts, ranges, scheduled_at=now)
+
+    try:
+        queue.enqueue_many(tasks)
+    finally:
+        queue.close()
 
 
 if __name__ == "__main__":
@@ -35,6 +35,33 @@ CREATE TABLE IF NOT EXISTS sentiment_events (
   is_negative BOOLEAN NOT NULL
 );
 
+CREATE TABLE IF NOT EXISTS event_rollups_hourly (
+  bucket TIMESTAMPTZ NOT NULL,
+  company_id INTEGER NOT NULL REFERENCES companies(id),
+  source TEXT NOT NULL,
+  total INTEGER NOT NULL,
+  one_star INTEGER NOT NULL,
+  negative INTEGER NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  updated_xid BIGINT NOT NULL DEFAULT pg_current_xact_id()::text::bigint,
+  PRIMARY KEY (bucket, company_id, source)
+);
+
+ALTER TABLE event_rollups_hourly ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+ALTER TABLE event_rollups_hourly ADD COLUMN IF NOT EXISTS updated_xid BIGINT NOT NULL DEFAULT pg_current_xact_id()::text::bigint;
+
+CREATE INDEX IF NOT EXISTS event_rollups_company_idx ON event_rollups_hourly (company_id, bucket DESC);
+CREATE INDEX IF NOT EXISTS event_rollups_xid_idx ON event_rollups_hourly (updated_xid);
+
+CREATE TABLE IF NOT EXISTS aggregation_state (
+  name TEXT PRIMARY KEY,
+  last_event_id BIGINT NOT NULL DEFAULT 0,
+  last_run_at TIMESTAMPTZ,
+  last_xmin BIGINT
+);
+
+ALTER TABLE aggregation_state ADD COLUMN IF NOT EXISTS last_xmin BIGINT;
+
 CREATE TABLE IF NOT EXISTS agg_windows (
   company_id INTEGER NOT NULL REFERENCES companies(id),
   window TEXT NOT NULL,
@@ -66,11 +93,55 @@ CREATE TABLE IF NOT EXISTS company_sources (
 
 ALTER TABLE companies ADD COLUMN IF NOT EXISTS featured_free BOOLEAN DEFAULT FALSE;
 
+CREATE TABLE IF NOT EXISTS fetch_cursors (
+  source TEXT NOT NULL,
+  company_id INTEGER NOT NULL REFERENCES companies(id),
+  last_seen_at TIMESTAMPTZ,
+  last_item_id TEXT,
+  resume_item_id TEXT,
+  pending_seen_at TIMESTAMPTZ,
+  pending_item_id TEXT,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (source, company_id)
+);
+
+ALTER TABLE fetch_cursors ADD COLUMN IF NOT EXISTS resume_item_id TEXT;
+ALTER TABLE fetch_cursors ADD COLUMN IF NOT EXISTS pending_seen_at TIMESTAMPTZ;
+ALTER TABLE fetch_cursors ADD COLUMN IF NOT EXISTS pending_item_id TEXT;
+
+CREATE TABLE IF NOT EXISTS crawl_schedule (
+  source TEXT NOT NULL,
+  company_id INTEGER NOT NULL REFERENCES companies(id),
+  activity DOUBLE PRECISION NOT NULL DEFAULT 0,
+  last_polled_at TIMESTAMPTZ,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (source, company_id)
+);
+
+CREATE TABLE IF NOT EXISTS robots_cache (
+  base_url TEXT PRIMARY KEY,
+  body TEXT NOT NULL DEFAULT '',
+  disallow_all BOOLEAN NOT NULL DEFAULT FALSE,
+  fetched_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  expires_at TIMESTAMPTZ NOT NULL
+);
+
 CREATE TABLE IF NOT EXISTS source_health (
   source TEXT PRIMARY KEY,
   consecutive_failures INTEGER NOT NULL DEFAULT 0,
   last_success TIMESTAMPTZ,
-  last_failure TIMESTAMPTZ
+  last_failure TIMESTAMPTZ,
+  circuit_state TEXT NOT NULL DEFAULT 'closed',
+  opened_until TIMESTAMPTZ,
+  circuit_trips INTEGER NOT NULL DEFAULT 0,
+  tick_at TIMESTAMPTZ,
+  tick_failed BOOLEAN NOT NULL DEFAULT FALSE
 );
 
+ALTER TABLE source_health ADD COLUMN IF NOT EXISTS circuit_state TEXT NOT NULL DEFAULT 'closed';
+ALTER TABLE source_health ADD COLUMN IF NOT EXISTS opened_until TIMESTAMPTZ;
+ALTER TABLE source_health ADD COLUMN IF NOT EXISTS circuit_trips INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE source_health ADD COLUMN IF NOT EXISTS tick_at TIMESTAMPTZ;
+ALTER TABLE source_health ADD COLUMN IF NOT EXISTS tick_failed BOOLEAN NOT NULL DEFAULT FALSE;
+
 SELECT add_retention_policy('raw_events', INTERVAL '90 days');
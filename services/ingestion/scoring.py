@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+
+METRIC_FIELDS = ("total", "one_star", "negative", "sources")
+
+
+@dataclass
+class WindowArrays:
+    company_ids: np.ndarray
+    current: np.ndarray
+    previous: np.ndarray
+
+    @classmethod
+    def empty(cls, company_ids: Sequence[int]) -> "WindowArrays":
+        ids = np.asarray(company_ids, dtype=np.int64)
+        zeros = np.zeros((len(ids), len(METRIC_FIELDS)), dtype=np.int64)
+        return cls(company_ids=ids, current=zeros, previous=zeros.copy())
+
+
+@dataclass
+class ScoredWindow:
+    company_ids: np.ndarray
+    complaint_count: np.ndarray
+    one_star_delta: np.ndarray
+    complaint_velocity: np.ndarray
+    negative_momentum: np.ndarray
+    source_diversity: np.ndarray
+    cts_score: np.ndarray
+    rank: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.company_ids)
+
+
+def safe_pct_delta(current: int, previous: int) -> float:
+    if previous <= 0:
+        return float(current) * 100.0
+    return ((current - previous) / previous) * 100.0
+
+
+def pct_delta(current: np.ndarray, previous: np.ndarray) -> np.ndarray:
+    current = current.astype(np.float64)
+    previous = previous.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = (current - previous) / previous * 100.0
+    return np.where(previous <= 0, current * 100.0, ratio)
+
+
+def compute_momentum_score(complaint_velocity, negative_momentum, source_diversity):
+    return (
+        complaint_velocity * 0.45
+        + source_diversity * 0.35
+        + negative_momentum * 0.20
+    )
+
+
+def rank_descending(scores: np.ndarray) -> np.ndarray:
+    order = np.argsort(-scores, kind="stable")
+    ranks = np.empty(len(scores), dtype=np.int64)
+    ranks[order] = np.arange(1, len(scores) + 1)
+    return ranks
+
+
+def score_window(arrays: WindowArrays, source_count: int) -> ScoredWindow:
+    current, previous = arrays.current, arrays.previous
+    complaint_velocity = pct_delta(current[:, 0], previous[:, 0])
+    one_star_delta = pct_delta(current[:, 1], previous[:, 1])
+    negative_momentum = pct_delta(current[:, 2], previous[:, 2])
+    source_diversity = current[:, 3].astype(np.float64) / source_count * 100.0
+    cts_score = compute_momentum_score(complaint_velocity, negative_momentum, source_diversity)
+    return ScoredWindow(
+        company_ids=arrays.company_ids,
+        complaint_count=current[:, 0],
+        one_star_delta=one_star_delta,
+        complaint_velocity=complaint_velocity,
+        negative_momentum=negative_momentum,
+        source_diversity=source_diversity,
+        cts_score=cts_score,
+        rank=rank_descending(cts_score),
+    )
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import Settings
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session(settings: Settings) -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=settings.http_pool_hosts,
+                pool_maxsize=settings.http_pool_size,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["User-Agent"] = settings.user_agent
+            _session = session
+        return _session
+
+
+@dataclass
+class CachedToken:
+    value: str
+    expires_at: float
+
+
+class TokenCache:
+    def __init__(self, refresh_margin: float = 60.0):
+        self.refresh_margin = refresh_margin
+        self._tokens: Dict[str, CachedToken] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, key: str, fetch: Callable[[], Tuple[str, float]]) -> str:
+        with self._key_lock(key):
+            cached = self._tokens.get(key)
+            if cached and time.time() < cached.expires_at - self.refresh_margin:
+                return cached.value
+            value, expires_in = fetch()
+            if value:
+                self._tokens[key] = CachedToken(value=value, expires_at=time.time() + expires_in)
+            return value
+
+    def invalidate(self, key: str) -> None:
+        with self._key_lock(key):
+            self._tokens.pop(key, None)
+
+
+_tokens: Optional[TokenCache] = None
+
+
+def get_token_cache(settings: Settings) -> TokenCache:
+    global _tokens
+    with _session_lock:
+        if _tokens is None:
+            _tokens = TokenCache(settings.token_refresh_margin)
+        return _tokens
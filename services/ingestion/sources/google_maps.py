@@ -7,6 +7,8 @@ from ..models import Company, RawEvent
 
 class GoogleMapsAdapter(BaseAdapter):
     source_name = "google_maps"
+    ready_selector = "div[role='feed']"
+    render_js = True
 
     def build_seed_urls(self, company: Company, since_ts):
         query = quote_plus(f"{company.name} complaints")
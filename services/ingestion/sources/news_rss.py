@@ -2,36 +2,75 @@ from datetime import datetime
 from urllib.parse import quote_plus
 
 import feedparser
+import requests
 
-from ..base import BaseAdapter
+from ..base import BaseAdapter, FetchResult
+from ..cursors import FetchCursor
 from ..dedupe import make_hash
+from ..httpcache import get_http_cache
 from ..models import Company, RawEvent
+from ..sessions import get_session
 
 
 class NewsRssAdapter(BaseAdapter):
     source_name = "news_rss"
 
     def fetch_events(self, company: Company, since_ts):
+        return self.fetch_feed(company, since_ts, None).events
+
+    def fetch_incremental(
+        self, companies: list[Company], since_ts, cursors: dict[int, FetchCursor]
+    ):
+        result = FetchResult([])
+        for company in companies:
+            feed_result = self.fetch_feed(company, since_ts, cursors.get(company.id))
+            result.events.extend(feed_result.events)
+            result.cursors.extend(feed_result.cursors)
+        return result
+
+    def fetch_feed(self, company: Company, since_ts, cursor: FetchCursor | None) -> FetchResult:
         query = quote_plus(company.name)
         feed_url = (
             "https://news.google.com/rss/search?q="
             f"{query}%20India&hl=en-IN&gl=IN&ceid=IN:en"
         )
-        feed = feedparser.parse(feed_url)
+        # Network errors, 5xx and 429 propagate so the task and the source
+        # breaker see the outage, as they do for fetched pages.
+        result = get_http_cache(self.settings).get(
+            get_session(self.settings), feed_url, self.settings.request_timeout
+        )
+        if result.status_code >= 500 or result.status_code == 429:
+            raise requests.HTTPError(f"{result.status_code} from {feed_url}")
+        # A 304 means nothing was published since the feed was last parsed.
+        if result.not_modified or result.status_code >= 400:
+            return FetchResult([])
+        feed = feedparser.parse(result.content)
+        since = cursor.last_seen_at if cursor and cursor.last_seen_at else since_ts
         events: list[RawEvent] = []
-        for entry in feed.entries[:10]:
+        newest: FetchCursor | None = None
+        for entry in feed.entries:
             published = entry.get("published_parsed")
             created = datetime.utcnow()
             if published:
                 created = datetime(*published[:6])
-            if since_ts and created < since_ts:
+            url = entry.get("link", feed_url)
+            entry_id = entry.get("id") or url
+            if published and (newest is None or created > newest.last_seen_at):
+                newest = FetchCursor(
+                    source=self.source_name,
+                    company_id=company.id,
+                    last_seen_at=created,
+                    last_item_id=entry_id,
+                )
+            if since and created < since:
+                continue
+            if cursor and entry_id == cursor.last_item_id:
                 continue
             title = entry.get("title", "").strip()
             summary = entry.get("summary", "").strip()
             text = " - ".join(filter(None, [title, summary]))
             if not text:
                 continue
-            url = entry.get("link", feed_url)
             events.append(
                 RawEvent(
                     source=self.source_name,
@@ -44,4 +83,4 @@ class NewsRssAdapter(BaseAdapter):
                     hash=make_hash(self.source_name, url, text),
                 )
             )
-        return events
+        return FetchResult(events, [newest] if newest else [])
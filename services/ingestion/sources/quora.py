@@ -1,5 +1,6 @@
 from ..base import BaseAdapter
 from ..errors import SkipSource
+from ..models import Company
 
 
 class QuoraAdapter(BaseAdapter):
@@ -1,16 +1,17 @@
 from datetime import datetime
-from urllib.parse import quote_plus
 
-import requests
-
-from ..base import BaseAdapter
+from ..base import BaseAdapter, FetchResult
+from ..cursors import FetchCursor, advance_cursors, shared_resume
 from ..errors import SkipSource
+from ..matching import CompanyMatcher, company_terms, pack_batches
 from ..models import Company, RawEvent
 from ..dedupe import make_hash
+from ..sessions import get_session, get_token_cache
 
 
 class RedditAdapter(BaseAdapter):
     source_name = "reddit"
+    page_size = 100
 
     def ensure_enabled(self) -> None:
         if not (self.settings.reddit_client_id and self.settings.reddit_client_secret):
@@ -18,11 +19,11 @@ class RedditAdapter(BaseAdapter):
         if not self.settings.reddit_user_agent:
             raise SkipSource("Missing Reddit user agent")
 
-    def _get_token(self) -> str:
+    def _request_token(self) -> tuple[str, float]:
         auth = (self.settings.reddit_client_id, self.settings.reddit_client_secret)
         data = {"grant_type": "client_credentials"}
         headers = {"User-Agent": self.settings.reddit_user_agent}
-        response = requests.post(
+        response = get_session(self.settings).post(
             "https://www.reddit.com/api/v1/access_token",
             auth=auth,
             data=data,
@@ -30,49 +31,129 @@ class RedditAdapter(BaseAdapter):
             timeout=self.settings.request_timeout,
         )
         response.raise_for_status()
-        return response.json().get("access_token", "")
+        payload = response.json()
+        return payload.get("access_token", ""), float(payload.get("expires_in", 3600))
+
+    def _get_token(self) -> str:
+        key = f"reddit:{self.settings.reddit_client_id}"
+        return get_token_cache(self.settings).get(key, self._request_token)
+
+    def build_query(self, companies: list[Company]) -> str:
+        terms = [term for company in companies for term in company_terms(company)]
+        return " OR ".join(f'"{term}"' for term in terms)
+
+    def plan_batches(self, companies: list[Company]) -> list[list[Company]]:
+        return pack_batches(
+            companies,
+            self.build_query,
+            self.settings.reddit_query_max_length,
+            self.settings.api_batch_size,
+        )
 
     def fetch_events(self, company: Company, since_ts):
+        return self.fetch_batch([company], since_ts)
+
+    def fetch_batch(self, companies: list[Company], since_ts):
+        return self.fetch_incremental(companies, since_ts, {}).events
+
+    def _search(self, params: dict) -> dict:
         token = self._get_token()
         if not token:
             raise SkipSource("Unable to obtain Reddit token")
-        query_terms = [company.name] + company.aliases
-        query = quote_plus(" OR ".join(query_terms))
         headers = {
             "Authorization": f"bearer {token}",
             "User-Agent": self.settings.reddit_user_agent,
         }
-        params = {"q": query, "sort": "new", "limit": 10}
-        response = requests.get(
+        response = get_session(self.settings).get(
             "https://oauth.reddit.com/search",
             headers=headers,
             params=params,
             timeout=self.settings.request_timeout,
         )
+        if response.status_code == 401:
+            get_token_cache(self.settings).invalidate(f"reddit:{self.settings.reddit_client_id}")
         response.raise_for_status()
-        data = response.json()
+        return response.json()
+
+    def fetch_incremental(
+        self, companies: list[Company], since_ts, cursors: dict[int, FetchCursor]
+    ):
+        query = self.build_query(companies)
+        if not query:
+            return FetchResult([])
+        positions = [cursors.get(company.id) for company in companies]
+        bounds = [
+            cursor.last_seen_at if cursor and cursor.last_seen_at else since_ts
+            for cursor in positions
+        ]
+        stop_at = min(bounds) if all(bounds) else None
+
+        # Search results are newest first; page backwards with `after` until a
+        # post older than the oldest position in the batch shows up.
+        params = {"q": query, "sort": "new", "limit": self.page_size}
+        resume = shared_resume(cursors, [company.id for company in companies])
+        if resume:
+            params["after"] = resume.resume_item_id
+        posts: list[dict] = []
+        reached = stop_at is None
+        for _ in range(max(1, self.settings.cursor_max_pages)):
+            listing = self._search(params).get("data", {})
+            for child in listing.get("children", []):
+                post = child.get("data", {})
+                if stop_at and datetime.utcfromtimestamp(post.get("created_utc", 0)) < stop_at:
+                    reached = True
+                    break
+                posts.append(post)
+            after = listing.get("after")
+            if not after:
+                reached = True
+            if reached:
+                break
+            params["after"] = after
+
+        matcher = CompanyMatcher(companies)
         events: list[RawEvent] = []
-        for child in data.get("data", {}).get("children", []):
-            post = child.get("data", {})
+        for post in posts:
             created = datetime.utcfromtimestamp(post.get("created_utc", 0))
-            if since_ts and created < since_ts:
-                continue
             title = post.get("title", "").strip()
             body = post.get("selftext", "").strip()
             text = " - ".join(filter(None, [title, body]))
             if not text:
                 continue
             url = f"https://www.reddit.com{post.get('permalink', '')}"
-            events.append(
-                RawEvent(
-                    source=self.source_name,
-                    company_id=company.id,
-                    url=url,
-                    text=text,
-                    rating=None,
-                    language=post.get("lang"),
-                    created_at=created,
-                    hash=make_hash(self.source_name, url, text),
+            for company in matcher.match(text):
+                cursor = cursors.get(company.id)
+                if cursor and cursor.last_seen_at:
+                    if post.get("name") == cursor.last_item_id or created < cursor.last_seen_at:
+                        continue
+                elif since_ts and created < since_ts:
+                    continue
+                events.append(
+                    RawEvent(
+                        source=self.source_name,
+                        company_id=company.id,
+                        url=url,
+                        text=text,
+                        rating=None,
+                        language=post.get("lang"),
+                        created_at=created,
+                        hash=make_hash(self.source_name, url, text),
+                    )
                 )
-            )
-        return events
+
+        newest = posts[0] if posts else None
+        advanced = advance_cursors(
+            self.source_name,
+            [company.id for company in companies],
+            cursors,
+            since_ts,
+            resume,
+            reached=reached,
+            newest=(
+                (datetime.utcfromtimestamp(newest.get("created_utc", 0)), newest.get("name"))
+                if newest
+                else None
+            ),
+            oldest_item_id=posts[-1].get("name") if posts else None,
+        )
+        return FetchResult(events, advanced)
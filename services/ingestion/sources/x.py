@@ -1,63 +1,168 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
-import requests
-
-from ..base import BaseAdapter
+from ..base import BaseAdapter, FetchResult
+from ..cursors import FetchCursor, advance_cursors, as_naive_utc, shared_resume
 from ..dedupe import make_hash
 from ..errors import SkipSource
+from ..matching import CompanyMatcher, company_terms, pack_batches
 from ..models import Company, RawEvent
+from ..sessions import get_session
+
+
+# Recent search rejects since_id and start_time older than seven days; keep a margin.
+RECENT_SEARCH_WINDOW = timedelta(days=6, hours=23)
+TWITTER_EPOCH_MS = 1288834974657
+
+
+def tweet_time(tweet_id: str) -> datetime:
+    """Creation time encoded in a snowflake tweet id."""
+    return datetime.utcfromtimestamp(((int(tweet_id) >> 22) + TWITTER_EPOCH_MS) / 1000)
 
 
 class XAdapter(BaseAdapter):
     source_name = "x"
+    page_size = 100
 
     def ensure_enabled(self) -> None:
         if not self.settings.x_bearer_token:
             raise SkipSource("Missing X API bearer token")
 
-    def fetch_events(self, company: Company, since_ts):
-        query_terms = [company.name] + company.aliases
-        query = " OR ".join([f'\"{term}\"' for term in query_terms if term])
+    def build_query(self, companies: list[Company]) -> str:
+        terms = [term for company in companies for term in company_terms(company)]
+        query = " OR ".join([f'"{term}"' for term in terms])
         if not query:
-            return []
-        query = f"{query} -is:retweet lang:en"
-        params = {
-            "query": query,
-            "max_results": 10,
-            "tweet.fields": "created_at,lang",
-        }
-        if since_ts:
-            params["start_time"] = since_ts.replace(microsecond=0).isoformat() + "Z"
-        response = requests.get(
+            return ""
+        if len(terms) > 1:
+            query = f"({query})"
+        return f"{query} -is:retweet lang:en"
+
+    def plan_batches(self, companies: list[Company]) -> list[list[Company]]:
+        return pack_batches(
+            companies,
+            self.build_query,
+            self.settings.x_query_max_length,
+            self.settings.api_batch_size,
+        )
+
+    def fetch_events(self, company: Company, since_ts):
+        return self.fetch_batch([company], since_ts)
+
+    def fetch_batch(self, companies: list[Company], since_ts):
+        return self.fetch_incremental(companies, since_ts, {}).events
+
+    def _search(self, params: dict) -> dict:
+        response = get_session(self.settings).get(
             "https://api.x.com/2/tweets/search/recent",
             headers={"Authorization": f"Bearer {self.settings.x_bearer_token}"},
             params=params,
             timeout=self.settings.request_timeout,
         )
         response.raise_for_status()
-        payload = response.json()
+        return response.json()
+
+    def fetch_incremental(
+        self, companies: list[Company], since_ts, cursors: dict[int, FetchCursor]
+    ):
+        query = self.build_query(companies)
+        if not query:
+            return FetchResult([])
+        params = {
+            "query": query,
+            "max_results": self.page_size,
+            "tweet.fields": "created_at,lang",
+        }
+        positions = [cursors.get(company.id) for company in companies]
+        oldest_allowed = datetime.utcnow() - RECENT_SEARCH_WINDOW
+        if all(
+            cursor
+            and cursor.last_item_id
+            and cursor.last_seen_at
+            and cursor.last_seen_at > oldest_allowed
+            for cursor in positions
+        ):
+            params["since_id"] = min((cursor.last_item_id for cursor in positions), key=int)
+        else:
+            # Start from the oldest position in the batch so companies with a
+            # cursor do not lose tweets between their cursor and since_ts.
+            bounds = [
+                cursor.last_seen_at if cursor and cursor.last_seen_at else since_ts
+                for cursor in positions
+            ]
+            if all(bounds):
+                start_time = max(min(bounds), oldest_allowed)
+                params["start_time"] = start_time.replace(microsecond=0).isoformat() + "Z"
+        bounded = "since_id" in params or "start_time" in params
+
+        resume = shared_resume(cursors, [company.id for company in companies])
+        if resume and tweet_time(resume.resume_item_id) <= oldest_allowed:
+            # Search can no longer page below it; start over from the newest tweets.
+            resume = None
+        if resume:
+            params["until_id"] = resume.resume_item_id
+
+        # since_id/start_time bound every page, so running out of next_token
+        # means every company's position was reached.
+        tweets: list[dict] = []
+        newest_id = None
+        next_token = None
+        for _ in range(max(1, self.settings.cursor_max_pages)):
+            payload = self._search(params)
+            tweets.extend(payload.get("data", []))
+            meta = payload.get("meta", {})
+            newest_id = newest_id or meta.get("newest_id")
+            next_token = meta.get("next_token")
+            if not next_token:
+                break
+            params["next_token"] = next_token
+
+        matcher = CompanyMatcher(companies)
         events: list[RawEvent] = []
-        for tweet in payload.get("data", []):
-            text = tweet.get("text", "").strip()
-            if not text:
-                continue
+        newest_at = None
+        for tweet in tweets:
             created_at = tweet.get("created_at")
             created = (
-                datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+                as_naive_utc(datetime.fromisoformat(created_at.replace("Z", "+00:00")))
                 if created_at
                 else datetime.utcnow()
             )
+            if tweet.get("id") == newest_id:
+                newest_at = created
+            text = tweet.get("text", "").strip()
+            if not text:
+                continue
+            tweet_id = int(tweet.get("id") or 0)
             url = f"https://x.com/i/web/status/{tweet.get('id')}"
-            events.append(
-                RawEvent(
-                    source=self.source_name,
-                    company_id=company.id,
-                    url=url,
-                    text=text,
-                    rating=None,
-                    language=tweet.get("lang"),
-                    created_at=created,
-                    hash=make_hash(self.source_name, url, text),
+            for company in matcher.match(text):
+                cursor = cursors.get(company.id)
+                if cursor and cursor.last_item_id:
+                    if tweet_id <= int(cursor.last_item_id):
+                        continue
+                else:
+                    bound = cursor.last_seen_at if cursor and cursor.last_seen_at else since_ts
+                    if bound and created < bound:
+                        continue
+                events.append(
+                    RawEvent(
+                        source=self.source_name,
+                        company_id=company.id,
+                        url=url,
+                        text=text,
+                        rating=None,
+                        language=tweet.get("lang"),
+                        created_at=created,
+                        hash=make_hash(self.source_name, url, text),
+                    )
                 )
-            )
-        return events
+
+        fetched_ids = [tweet["id"] for tweet in tweets if tweet.get("id")]
+        advanced = advance_cursors(
+            self.source_name,
+            [company.id for company in companies],
+            cursors,
+            since_ts,
+            resume,
+            reached=not next_token or not bounded,
+            newest=(newest_at or datetime.utcnow(), newest_id) if newest_id else None,
+            oldest_item_id=min(fetched_ids, key=int) if fetched_ids else None,
+        )
+        return FetchResult(events, advanced)
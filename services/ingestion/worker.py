@@ -3,18 +3,23 @@ from __future__ import annotations
 import argparse
 import json
 import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
 
-from .companies import fetch_companies
+from .browser import close_browser_pool
+from .companies import get_company_catalog, select_shard
 from .config import get_settings
-from .db import get_connection, insert_events_with_sentiment
-from .errors import SkipSource
-from .language import detect_language
-from .health import update_source_health
+from .cursors import load_cursors
+from .db import BulkEventWriter, close_pool, pooled_connection
+from .dedupe import get_seen_hashes
+from .errors import CircuitOpen, SkipSource
+from .fetcher import get_fetcher
+from .enrich import close_enrichment_pool, get_enrichment_pool
+from .health import load_source_circuit, save_source_circuit, update_source_health
 from .models import Task
-from .queue import LocalQueue, SqsQueue, parse_task
-from .robots import RobotsChecker
-from .sentiment import score_sentiment
+from .queue import SQS_BATCH_LIMIT, build_queue, parse_task
+from .robots import get_robots_checker
 from .sources import ADAPTERS
 
 
@@ -30,76 +35,202 @@ def handle_task(task: Task, logger: logging.Logger) -> None:
         logger.warning("Unknown source %s", task.source)
         return
 
-    robots = RobotsChecker(settings.user_agent)
-    adapter = adapter_cls(settings, robots)
+    adapter = adapter_cls(settings, get_robots_checker(settings))
 
-    conn = get_connection()
-    companies = fetch_companies(conn)
+    with pooled_connection() as conn:
+        run_task(conn, task, adapter, logger)
+
+
+def run_task(conn, task: Task, adapter, logger: logging.Logger) -> None:
+    settings = adapter.settings
+    companies = select_shard(get_company_catalog(settings).get(conn), task)
+    # Shards enqueued by the same scheduler tick share one health record.
+    tick_at = task.scheduled_at or task.since_ts or datetime.utcnow()
     try:
         adapter.ensure_enabled()
     except SkipSource as exc:
         logger.info("Source %s skipped: %s", task.source, exc)
-        update_source_health(conn, task.source, had_error=False)
+        update_source_health(conn, task.source, False, tick_at)
+        return
+    breaker = load_source_circuit(conn, task.source, settings)
+    if breaker.retry_in() > 0:
+        logger.info(
+            "Source %s circuit open; retrying in %.0fs", task.source, breaker.retry_in()
+        )
         return
+    adapter.prefetch_robots(conn, companies, task.since_ts)
+    adapter.load_host_circuits(conn, companies, task.since_ts)
+    fetcher = get_fetcher(settings)
 
     total_inserted = 0
     had_error = False
-    for company in companies:
+    skipped = 0
+    enrichment = get_enrichment_pool(settings)
+    flush_at = max(1, settings.enrich_batch_size * settings.enrich_workers)
+    seen = get_seen_hashes(conn, settings)
+    cursors = load_cursors(conn, task.source, [company.id for company in companies])
+    pending = []
+    pending_cursors = []
+
+    def on_flush(payload, inserted: int) -> None:
+        seen.add_many(event.hash for event, _, _ in payload)
+        logger.info("Source %s inserted %s events", task.source, inserted)
+
+    writer = BulkEventWriter(
+        conn,
+        flush_rows=settings.bulk_flush_rows,
+        flush_seconds=settings.bulk_flush_seconds,
+        on_flush=on_flush,
+    )
+
+    def flush() -> int:
+        enriched = enrichment.enrich(pending)
+        advanced = list(pending_cursors)
+        pending.clear()
+        pending_cursors.clear()
+        return writer.add(enriched, advanced)
+
+    def fetch(batch):
+        ticket = breaker.allow()
+        if ticket is None:
+            raise CircuitOpen(f"Source {task.source} circuit open")
         try:
-            events = adapter.fetch_events(company, task.since_ts)
-        except Exception as exc:
-            logger.warning(
-                "Source %s company %s failed: %s",
+            result = adapter.fetch_incremental(batch, task.since_ts, cursors)
+        except Exception:
+            breaker.record_failure(ticket)
+            raise
+        breaker.record_success(ticket)
+        return result
+
+    max_workers = settings.concurrency_for(task.source)
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix=f"fetch-{task.source}"
+    ) as executor:
+        futures = {
+            executor.submit(fetch, batch): batch
+            for batch in adapter.plan_batches(companies)
+        }
+        for future in as_completed(futures):
+            names = ", ".join(company.name for company in futures[future])
+            if breaker.changed:
+                save_source_circuit(conn, task.source, breaker)
+            fetcher.save_hosts(conn)
+            try:
+                result = future.result()
+            except CircuitOpen:
+                skipped += 1
+                had_error = True
+                continue
+            except Exception as exc:
+                logger.warning(
+                    "Source %s company %s failed: %s",
+                    task.source,
+                    names,
+                    exc,
+                )
+                had_error = True
+                continue
+            fresh = seen.filter_new(result.events)
+            logger.info(
+                "Source %s company %s fetched %s events (%s new)",
                 task.source,
-                company.name,
-                exc,
+                names,
+                len(result.events),
+                len(fresh),
             )
-            had_error = True
-            continue
-        enriched = []
-        for event in events:
-            event.language = detect_language(event.text)
-            sentiment_score, is_negative = score_sentiment(event.text)
-            enriched.append((event, sentiment_score, is_negative))
-        inserted = insert_events_with_sentiment(conn, enriched)
-        total_inserted += inserted
-        logger.info(
-            "Source %s company %s inserted %s events",
-            task.source,
-            company.name,
-            inserted,
+            pending.extend(fresh)
+            pending_cursors.extend(result.cursors)
+            if len(pending) >= flush_at:
+                total_inserted += flush()
+
+    if pending or pending_cursors:
+        total_inserted += flush()
+    total_inserted += writer.flush()
+    if breaker.changed:
+        save_source_circuit(conn, task.source, breaker)
+    fetcher.save_hosts(conn)
+    if skipped:
+        logger.warning(
+            "Source %s circuit open; skipped %s of %s batches", task.source, skipped, len(futures)
         )
 
     logger.info("Source %s total inserted %s", task.source, total_inserted)
-    consecutive = update_source_health(conn, task.source, had_error)
-    if consecutive >= 2:
-        logger.warning(\"ALERT: Source %s failed %s consecutive runs\", task.source, consecutive)
+    consecutive = update_source_health(conn, task.source, had_error, tick_at)
+    if had_error and consecutive >= 2:
+        logger.warning("ALERT: Source %s failed %s consecutive runs", task.source, consecutive)
+
+
+def run_loop(queue, settings, logger: logging.Logger, once: bool = False) -> None:
+    concurrency = max(1, settings.worker_concurrency)
+    in_flight: dict[Future, dict] = {}
+    polled = False
+    last_heartbeat = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="task") as executor:
+        while True:
+            free = concurrency - len(in_flight)
+            if free > 0 and not (once and polled):
+                started = time.monotonic()
+                messages = queue.poll(max_messages=min(free, SQS_BATCH_LIMIT))
+                polled = True
+                for message in messages:
+                    task = parse_task(message)
+                    logger.info("Processing task %s", task)
+                    in_flight[executor.submit(handle_task, task, logger)] = message
+                if not messages and not in_flight:
+                    if once:
+                        break
+                    idle = settings.idle_sleep_seconds - (time.monotonic() - started)
+                    if idle > 0:
+                        time.sleep(idle)
+                    continue
+            if not in_flight:
+                break
+
+            timeout = settings.heartbeat_seconds
+            if free > 0 and not once:
+                timeout = min(timeout, settings.idle_sleep_seconds)
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            finished = []
+            for future in done:
+                message = in_flight.pop(future)
+                try:
+                    future.result()
+                except Exception:
+                    logger.exception("Task %s failed; leaving it for redelivery", message.get("Body"))
+                    continue
+                finished.append(message.get("ReceiptHandle", ""))
+            if finished:
+                queue.delete_many(finished)
+
+            if in_flight and time.monotonic() - last_heartbeat >= settings.heartbeat_seconds:
+                queue.change_visibility_many(
+                    [message.get("ReceiptHandle", "") for message in in_flight.values()],
+                    settings.visibility_timeout,
+                )
+                last_heartbeat = time.monotonic()
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--once", action="store_true", help="Process a single batch")
-    parser.add_argument("--local", action="store_true", help="Use local in-memory queue")
+    parser.add_argument(
+        "--local", action="store_true", help="Use the local SQLite queue (LOCAL_QUEUE_PATH)"
+    )
     args = parser.parse_args()
 
     settings = get_settings()
     logger = build_logger(settings.log_level)
 
-    queue = LocalQueue() if args.local or not settings.sqs_queue_url else SqsQueue()
+    queue = build_queue(settings, local=args.local)
 
-    while True:
-        messages = queue.poll(max_messages=5)
-        if not messages:
-            if args.once:
-                break
-            continue
-        for message in messages:
-            task = parse_task(message)
-            logger.info("Processing task %s", task)
-            handle_task(task, logger)
-            queue.delete(message.get("ReceiptHandle", ""))
-        if args.once:
-            break
+    try:
+        run_loop(queue, settings, logger, once=args.once)
+    finally:
+        queue.close()
+        close_browser_pool()
+        close_enrichment_pool()
+        close_pool()
 
 
 if __name__ == "__main__":